@@ -2,6 +2,12 @@ import flask
 import requests
 from utils.api_key_generation import validate_api_key
 from utils.helpers import validate_api_key_request
+from utils import http_client
+from utils.api_key_cache import verified_key_cache, negative_key_cache
+from utils.response_cache import response_cache, normalize_url, CACHED_HEADERS
+from utils.http_cache import etag_matches
+from utils.compression import compress_flask_response, compression_stats, precompress_static, send_precompressed
+from utils.api_key_generation import key_id_filter, revoked_key_set
 from app.dashboard import Dashboard
 from app.index import Index
 from app.login import Login
@@ -18,6 +24,7 @@ from auth.logout import OAuthLogout
 from flask import jsonify,request,render_template, url_for
 from dotenv import load_dotenv 
 
+import hmac
 import os
 app = flask.Flask(__name__, template_folder='static/templates')       
 app.secret_key = os.urandom(24)
@@ -27,6 +34,56 @@ openapi_schema = None
 
 load_dotenv()
 FASTAPI_URL = os.getenv("FASTAPI_URL", "http://127.0.0.1:8000")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+precompress_static(app.static_folder)
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli for pages and buffered API responses; streamed ones keep FastAPI's encoding."""
+    return compress_flask_response(response, request.headers.get("Accept-Encoding"), request.endpoint)
+
+def serve_static(filename):
+    """Flask's static view, serving the precompressed .br/.gz copy when the client accepts it."""
+    return send_precompressed(app.static_folder, filename, request.headers.get("Accept-Encoding"))
+
+app.view_functions["static"] = serve_static
+
+def conditional_headers():
+    """The client's validators, forwarded so FastAPI can answer 304 Not Modified."""
+    headers = {}
+    if request.headers.get("If-None-Match"):
+        headers["If-None-Match"] = request.headers["If-None-Match"]
+    return headers
+
+def upstream_headers():
+    """Client headers forwarded to FastAPI on streamed (pass-through) requests."""
+    headers = {"Accept-Encoding": request.headers.get("Accept-Encoding", "identity"), **conditional_headers()}
+    if request.headers.get("Accept"):
+        headers["Accept"] = request.headers["Accept"]  # Image format negotiation
+    return headers
+
+def cached_get(route, path, params=None):
+    """GET an idempotent FastAPI resource through the gateway response cache.
+
+    The cache key is the normalized upstream URL, so the caller's API key is never
+    part of it. Only responses FastAPI marks cacheable are stored.
+    """
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    url = f"{FASTAPI_URL}{path}"
+    cache_key = normalize_url(url, params)
+
+    cached = response_cache.get(route, cache_key)
+    if cached:
+        if etag_matches(cached.headers.get("ETag"), request.headers.get("If-None-Match")):
+            not_modified = {name: cached.headers[name] for name in ("ETag", "Cache-Control") if name in cached.headers}
+            return flask.Response(status=304, headers=not_modified)
+        return flask.Response(cached.body, cached.status, cached.headers)
+
+    response = http_client.get(url, params=params, headers=conditional_headers())
+    response_cache.store(route, cache_key, response.status_code, response.headers, response.content)
+    headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+    return flask.Response(response.content, response.status_code, headers)
 
 app.add_url_rule('/',
                  view_func=Index.as_view('index'),
@@ -78,19 +135,44 @@ def placeholder_image(category, apikey, name, width, height):
         return error_response  # Return error if API key is invalid/missing
 
     fastapi_url = f"{FASTAPI_URL}/{category}/{name}/{width}/{height}/"
-    response = requests.get(fastapi_url)
+    response = http_client.get(fastapi_url, params=request.args, stream=True, headers=upstream_headers())
 
-    if response.status_code == 200:
-        return response.content, 200, {'Content-Type': 'image/jpeg'}
+    # 503 carries Retry-After when resizing is saturated; 4xx other than 404 carry FastAPI's reason
+    # for the rejection (bad format, quality, preset or synthetic image name)
+    if response.status_code in (200, 304, 503) or (400 <= response.status_code < 500 and response.status_code != 404):
+        return http_client.stream_response(response)
+
+    response.close()
 
     if response.status_code == 404:
         if name == "random":  # Prevent infinite loop if even `/random/` fails
             return flask.jsonify({"error": f"No images found in category '{category}'"}), 404
 
-        return flask.redirect(f"/api/{category}/{apikey}/random/{width}/{height}/")
+        return flask.redirect(url_for("placeholder_image", category=category, apikey=apikey, name="random",
+                                      width=width, height=height, **request.args))
     
     return flask.jsonify({"error": "Unexpected error from image service"}), response.status_code
 
+@app.route("/api/images/batch/<apikey>", methods=["POST"])
+def batch_images(apikey):
+    """Many placeholder variants in one streamed zip or multipart response; the key is checked once."""
+    error_response = validate_api_key_request(apikey)
+    if error_response:
+        return error_response
+
+    response = http_client.post(f"{FASTAPI_URL}/images/batch", params=request.args, data=request.get_data(),
+                                stream=True, headers={"Content-Type": "application/json", **upstream_headers()})
+    return http_client.stream_response(response)
+
+@app.route("/api/previews/<apikey>/<category>", methods=["GET"])
+def get_image_previews(apikey, category):
+    """BlurHash and tiny base64 previews of every image in a category, in one JSON response."""
+    error_response = validate_api_key_request(apikey)
+    if error_response:
+        return error_response
+
+    return cached_get("image_previews", f"/images/{category}/previews")
+
 @app.route("/api/paragraphs/<apikey>", methods=["GET"])
 def get_paragraphs(apikey):
     """Flask route that validates API key & forwards request to FastAPI"""
@@ -106,7 +188,7 @@ def get_paragraphs(apikey):
     fastapi_url = f"{FASTAPI_URL}/paragraphs?{query_params}"
 
     try:
-        response = requests.get(fastapi_url)
+        response = http_client.get(fastapi_url)
         return response.content, response.status_code, response.headers.items()
     except requests.RequestException as e:
         print(f"Error forwarding request to FastAPI: {e}")
@@ -121,13 +203,14 @@ def download_file():
         return flask.jsonify({"error": "Missing file parameter"}), 400
 
     # Proxy request to FastAPI
-    fastapi_download_url = f"{FASTAPI_URL}/download_file?file={file_path}"
-    response = requests.get(fastapi_download_url)
+    fastapi_download_url = f"{FASTAPI_URL}/download_file"
+    response = http_client.get(fastapi_download_url, params={"file": file_path}, stream=True, headers=upstream_headers())
 
-    # Return FastAPI’s response back to user
+    # Stream FastAPI’s response back to user
     if response.status_code == 200:
-        return flask.Response(response.content, response.status_code, response.headers.items())
-    
+        return http_client.stream_response(response)
+
+    response.close()
     return flask.jsonify({"error": "File not found"}), 404
 
 # Weather API (Single Date)
@@ -137,9 +220,7 @@ def get_weather_for_date(apikey):
     if error_response:
         return error_response
 
-    fastapi_url = f"{FASTAPI_URL}/weather/date/"
-    response = requests.get(fastapi_url, params=request.args)
-    return response.content, response.status_code
+    return cached_get("weather_date", "/weather/date/", request.args.to_dict())
 
 # Weather API (Monthly)
 @app.route("/api/weather/month/<apikey>", methods=["GET"])
@@ -148,9 +229,12 @@ def get_weather_for_month(apikey):
     if error_response:
         return error_response
 
-    fastapi_url = f"{FASTAPI_URL}/weather/month/"
-    response = requests.get(fastapi_url, params=request.args)
-    return response.content, response.status_code
+    return cached_get("weather_month", "/weather/month/", request.args.to_dict())
+
+def invalidate_course_cache(courseId):
+    """Drop gateway-cached header and gradebook responses for a (re)generated course."""
+    response_cache.invalidate_prefix("course_header", f"{FASTAPI_URL}/api/header/{courseId}")
+    response_cache.invalidate_prefix("gradebook", f"{FASTAPI_URL}/api/gradebook/{courseId}")
 
 @app.route("/api/generate_course/<apikey>", methods=["GET", "POST"])
 def generate_course(apikey):
@@ -173,12 +257,13 @@ def generate_course(apikey):
         if weight_sum != 100:
             return jsonify({"error": f"Total weightage must be exactly 100%. Provided: {weight_sum}%"}), 400
 
-        response = requests.get(fastapi_url, params=request.args)
+        response = http_client.get(fastapi_url, params=request.args)
 
 
         if response.status_code != 200:
             return jsonify({"error": response.text}), response.status_code  # Return error as JSON
 
+        invalidate_course_cache(request.args.get("courseId", "TEST101"))
         return jsonify(response.json()), response.status_code
 
     if request.method == "POST":
@@ -192,11 +277,12 @@ def generate_course(apikey):
         if weight_sum != 100:
             return jsonify({"error": f"Total weightage must be exactly 100%. Provided: {weight_sum}%"}), 400
 
-        response = requests.post(fastapi_url, json=data)
+        response = http_client.post(fastapi_url, json=data)
 
         if response.status_code != 200:
             return jsonify({"error": response.text}), response.status_code  # Return error as JSON
 
+        invalidate_course_cache(data.get("courseId"))
         return jsonify(response.json()), response.status_code
 
 
@@ -208,9 +294,7 @@ def get_course_header(apikey, courseId):
     if error_response:
         return error_response
 
-    fastapi_url = f"{FASTAPI_URL}/api/header/{courseId}"
-    response = requests.get(fastapi_url)
-    return jsonify(response.json()), response.status_code
+    return cached_get("course_header", f"/api/header/{courseId}")
 
 @app.route("/api/gradebook/<apikey>/<courseId>", methods=["GET"])
 def get_gradebook(apikey, courseId):
@@ -220,10 +304,7 @@ def get_gradebook(apikey, courseId):
         return error_response
 
     format_type = request.args.get("format", "json")  # Default to JSON if format is not provided
-    fastapi_url = f"{FASTAPI_URL}/api/gradebook/{courseId}?format={format_type}"
-    response = requests.get(fastapi_url)
-
-    return flask.Response(response.content, response.status_code, response.headers.items())
+    return cached_get("gradebook", f"/api/gradebook/{courseId}", {"format": format_type})
 
 
 @app.route("/api/starwars/films/<apikey>", methods=["GET"])
@@ -237,16 +318,13 @@ def get_starwars_films(apikey):
     search = request.args.get("search", None)
     format_type = request.args.get("format", "json")
     
-    fastapi_url = f"{FASTAPI_URL}/starwars/films"
     params = {
         "skip": skip,
         "limit": limit,
         "search": search,
         "format": format_type
     }
-    response = requests.get(fastapi_url, params=params)
-    
-    return flask.Response(response.content, response.status_code, response.headers.items())
+    return cached_get("starwars_list", "/starwars/films", params)
 
 @app.route("/api/starwars/people/<apikey>", methods=["GET"])
 def get_starwars_people(apikey):
@@ -259,16 +337,13 @@ def get_starwars_people(apikey):
     search = request.args.get("search", None)
     format_type = request.args.get("format", "json")
     
-    fastapi_url = f"{FASTAPI_URL}/starwars/people"
     params = {
         "skip": skip,
         "limit": limit,
         "search": search,
         "format": format_type
     }
-    response = requests.get(fastapi_url, params=params)
-    
-    return flask.Response(response.content, response.status_code, response.headers.items())
+    return cached_get("starwars_list", "/starwars/people", params)
 
 @app.route("/api/starwars/planets/<apikey>", methods=["GET"])
 def get_starwars_planets(apikey):
@@ -281,16 +356,13 @@ def get_starwars_planets(apikey):
     search = request.args.get("search", None)
     format_type = request.args.get("format", "json")
     
-    fastapi_url = f"{FASTAPI_URL}/starwars/planets"
     params = {
         "skip": skip,
         "limit": limit,
         "search": search,
         "format": format_type
     }
-    response = requests.get(fastapi_url, params=params)
-    
-    return flask.Response(response.content, response.status_code, response.headers.items())
+    return cached_get("starwars_list", "/starwars/planets", params)
 
 @app.route("/api/starwars/species/<apikey>", methods=["GET"])
 def get_starwars_species(apikey):
@@ -303,16 +375,13 @@ def get_starwars_species(apikey):
     search = request.args.get("search", None)
     format_type = request.args.get("format", "json")
     
-    fastapi_url = f"{FASTAPI_URL}/starwars/species"
     params = {
         "skip": skip,
         "limit": limit,
         "search": search,
         "format": format_type
     }
-    response = requests.get(fastapi_url, params=params)
-    
-    return flask.Response(response.content, response.status_code, response.headers.items())
+    return cached_get("starwars_list", "/starwars/species", params)
 
 @app.route("/api/starwars/starships/<apikey>", methods=["GET"])
 def get_starwars_starships(apikey):
@@ -325,16 +394,13 @@ def get_starwars_starships(apikey):
     search = request.args.get("search", None)
     format_type = request.args.get("format", "json")
     
-    fastapi_url = f"{FASTAPI_URL}/starwars/starships"
     params = {
         "skip": skip,
         "limit": limit,
         "search": search,
         "format": format_type
     }
-    response = requests.get(fastapi_url, params=params)
-    
-    return flask.Response(response.content, response.status_code, response.headers.items())
+    return cached_get("starwars_list", "/starwars/starships", params)
 
 @app.route("/api/starwars/vehicles/<apikey>", methods=["GET"])
 def get_starwars_vehicles(apikey):
@@ -347,16 +413,13 @@ def get_starwars_vehicles(apikey):
     search = request.args.get("search", None)
     format_type = request.args.get("format", "json")
     
-    fastapi_url = f"{FASTAPI_URL}/starwars/vehicles"
     params = {
         "skip": skip,
         "limit": limit,
         "search": search,
         "format": format_type
     }
-    response = requests.get(fastapi_url, params=params)
-    
-    return flask.Response(response.content, response.status_code, response.headers.items())
+    return cached_get("starwars_list", "/starwars/vehicles", params)
 
 # Additional endpoint to get a specific entity by ID
 @app.route("/api/starwars/<string:entity_type>/<int:entity_id>/<apikey>", methods=["GET"])
@@ -371,39 +434,55 @@ def get_starwars_entity(entity_type, entity_id, apikey):
     if entity_type_lower not in ['films', 'people', 'planets', 'species', 'starships', 'vehicles']:
         return flask.jsonify({"error": f"Invalid entity type: {entity_type}"}), 400
     
-    fastapi_url = f"{FASTAPI_URL}/starwars/{entity_type_lower}/{entity_id}"
     params = {
         "format": format_type
     }
-    response = requests.get(fastapi_url, params=params)
+    return cached_get("starwars_entity", f"/starwars/{entity_type_lower}/{entity_id}", params)
+
+# ============= Internal Stats ================
+@app.route("/internal/stats", methods=["GET"])
+def gateway_stats():
+    """Gateway cache counters. Only served when X-Admin-Token matches ADMIN_TOKEN."""
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        return jsonify({"error": "Not found"}), 404
+
+    return jsonify({
+        "api_key_cache": verified_key_cache.stats(),
+        "negative_key_cache": negative_key_cache.stats(),
+        "key_id_filter": key_id_filter.stats(),
+        "revoked_key_set": revoked_key_set.stats(),
+        "response_cache": response_cache.stats(),
+        "compression": compression_stats.stats(),
+        "service": service_stats()
+    })
+
+def service_stats():
+    """FastAPI's own counters, or None if the service cannot be reached."""
+    try:
+        return http_client.get(f"{FASTAPI_URL}/internal/stats").json()
+    except (requests.RequestException, ValueError):
+        return None
 
 # ============= Swagger UI Routes ================
 @app.route("/docs")
 def api_docs():
     """Proxy to FastAPI Swagger UI without requiring authentication."""
-    response = requests.get(f"{FASTAPI_URL}/docs", stream=True)
-    return flask.Response(
-        response.content, 
-        status=response.status_code, 
-        content_type=response.headers.get('Content-Type')
-    )
+    response = http_client.get(f"{FASTAPI_URL}/docs", stream=True, headers=upstream_headers())
+    return http_client.stream_response(response)
 
 @app.route("/redoc")
 def api_redoc():
     """Proxy to FastAPI ReDoc UI without requiring authentication."""
-    response = requests.get(f"{FASTAPI_URL}/redoc", stream=True)
-    return flask.Response(
-        response.content, 
-        status=response.status_code, 
-        content_type=response.headers.get('Content-Type')
-    )
+    response = http_client.get(f"{FASTAPI_URL}/redoc", stream=True, headers=upstream_headers())
+    return http_client.stream_response(response)
 
 @app.route("/openapi.json")
 def api_openapi_schema():
     """Serve the OpenAPI schema with modifications for Swagger UI."""
     global openapi_schema
     if openapi_schema is None:
-        response = requests.get(f"{FASTAPI_URL}/openapi.json")
+        response = http_client.get(f"{FASTAPI_URL}/openapi.json")
         if response.status_code == 200:
             schema = response.json()
             
@@ -478,22 +557,14 @@ def api_openapi_schema():
 @app.route("/docs/<path:path>")
 def api_swagger_static(path):
     """Proxy to Swagger UI static files."""
-    response = requests.get(f"{FASTAPI_URL}/docs/{path}", stream=True)
-    return flask.Response(
-        response.content, 
-        status=response.status_code, 
-        content_type=response.headers.get('Content-Type')
-    )
+    response = http_client.get(f"{FASTAPI_URL}/docs/{path}", stream=True, headers=upstream_headers())
+    return http_client.stream_response(response)
 
 @app.route("/redoc/<path:path>")
 def api_redoc_static(path):
     """Proxy to ReDoc static files."""
-    response = requests.get(f"{FASTAPI_URL}/redoc/{path}", stream=True)
-    return flask.Response(
-        response.content, 
-        status=response.status_code, 
-        content_type=response.headers.get('Content-Type')
-    )
+    response = http_client.get(f"{FASTAPI_URL}/redoc/{path}", stream=True, headers=upstream_headers())
+    return http_client.stream_response(response)
 
     return flask.Response(response.content, response.status_code, response.headers.items())
 
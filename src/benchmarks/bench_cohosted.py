@@ -0,0 +1,110 @@
+"""
+Gateway -> FastAPI call latency: loopback HTTP through the pooled client (split
+mode) versus in-process dispatch through ASGIAdapter (co-hosted mode).
+
+A small FastAPI app stands in for the service so the numbers isolate the hop
+itself. Run from src/:
+
+    python -m benchmarks.bench_cohosted --requests 2000 --concurrency 8
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from utils.asgi_adapter import ASGIAdapter
+from utils.http_client import create_adapter
+
+PAYLOAD = {"count": 10, "results": [{"name": f"entity {i}", "id": i} for i in range(10)]}
+
+service = FastAPI()
+
+
+@service.get("/starwars/films")
+async def films():
+    return JSONResponse(PAYLOAD)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _session(prefix, transport):
+    session = requests.Session()
+    session.mount(prefix, transport)
+    return session
+
+
+def _run(url, make_session, total, concurrency):
+    local = threading.local()
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        if not hasattr(local, "session"):
+            local.session = make_session()
+        started = time.perf_counter()
+        local.session.get(url).json()
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": total / wall,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = uvicorn.Server(uvicorn.Config(service, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    pooled = create_adapter()
+    in_process = ASGIAdapter(service, loop)
+    url = f"{base_url}/starwars/films"
+
+    results = {
+        "split (loopback HTTP, pooled)": _run(url, lambda: _session("http://", pooled), args.requests, args.concurrency),
+        "cohosted (in-process ASGI)": _run(url, lambda: _session(base_url, in_process), args.requests, args.concurrency),
+    }
+    server.should_exit = True
+    loop.call_soon_threadsafe(loop.stop)
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}")
+    print(f"{'mode':32} {'req/s':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:32} {r['rps']:9.0f} {r['mean_ms']:9.2f} {r['p50_ms']:9.2f} {r['p99_ms']:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
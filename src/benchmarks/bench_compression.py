@@ -0,0 +1,74 @@
+"""
+Bytes on the wire per endpoint, uncompressed vs. gzip vs. brotli, and the CPU
+cost of compressing each response on the fly.
+
+Payloads are rendered with the services' own HTML/JSON builders from the local
+Star Wars data and generated weather, plus the static assets that are served
+precompressed. Run from src/:
+
+    python -m benchmarks.bench_compression
+
+Live per-endpoint counters for real traffic are in GET /internal/stats.
+"""
+import argparse
+import json
+import os
+import time
+
+from services.starwars_service import generate_entity_html_response
+from services.weather_service import generate_weather_data, generate_month_html_response
+from utils.compression import brotli, compress
+
+STATIC_ASSETS = ("static/swagger-ui-bundle.js", "static/styles.css")
+
+
+def starwars_list(filename, limit):
+    with open(os.path.join("data", filename)) as f:
+        records = json.load(f)[:limit]
+    return {"count": len(records), "results": [dict(record["fields"], id=record["pk"]) for record in records]}
+
+
+def payloads(limit):
+    people = starwars_list("people.json", limit)
+    planets = starwars_list("planets.json", limit)
+    month = [generate_weather_data(f"2024-07-{day:02d}") for day in range(1, 32)]
+
+    yield "starwars people (json)", json.dumps(people).encode()
+    yield "starwars people (html)", generate_entity_html_response(people, "Person", "html").body
+    yield "starwars planets (html)", generate_entity_html_response(planets, "Planet", "html").body
+    yield "weather month (json)", json.dumps(month).encode()
+    yield "weather month (html)", generate_month_html_response(month, "2024-07", "html").body
+    for path in STATIC_ASSETS:
+        with open(path, "rb") as f:
+            yield path, f.read()
+
+
+def measure(data, encoding, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        size = len(compress(data, encoding))
+    return size, (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=100, help="Star Wars records per list")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    encodings = ["gzip"] + (["br"] if brotli else [])
+    header = f"{'payload':<34}{'identity':>11}" + "".join(f"{name:>11}{'saved':>8}{'ms':>8}" for name in encodings)
+    print(header)
+    print("-" * len(header))
+    for name, data in payloads(args.limit):
+        row = f"{name:<34}{len(data):>11,}"
+        for encoding in encodings:
+            size, ms = measure(data, encoding, args.repeat)
+            row += f"{size:>11,}{1 - size / len(data):>8.0%}{ms:>8.2f}"
+        print(row)
+    if not brotli:
+        print("\n(brotli not installed: gzip only)")
+
+
+if __name__ == "__main__":
+    main()
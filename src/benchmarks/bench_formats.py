@@ -0,0 +1,54 @@
+"""
+Placeholder output formats compared: bytes served and encode time per format
+and quality, for the same resized source photos. Run from src/:
+
+    python -m benchmarks.bench_formats --sizes 300x200 800x600 --qualities 50 75
+"""
+import argparse
+import glob
+import io
+import statistics
+import time
+
+from utils.image_processing import OUTPUT_FORMATS, DecodedImageCache, encode_image, output_quality, resize_pixels
+
+
+def encoded(image, image_format, quality, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        buffer = io.BytesIO()
+        encode_image(image, buffer, image_format, quality)
+    return buffer.tell(), (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="static/*-images/*.jpg")
+    parser.add_argument("--sizes", nargs="+", default=["300x200", "800x600"])
+    parser.add_argument("--qualities", nargs="*", type=int, default=[], help="Also encode at these qualities")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sources = sorted(glob.glob(args.images))
+    sizes = [tuple(int(n) for n in size.split("x")) for size in args.sizes]
+    settings = [(name, None) for name in OUTPUT_FORMATS]
+    settings += [(name, quality) for quality in args.qualities for name in OUTPUT_FORMATS
+                 if output_quality(name, quality) not in (None, output_quality(name))]
+    print(f"{len(sources)} source images; formats: {', '.join(OUTPUT_FORMATS)}\n")
+    print(f"{'size':<10}{'format':<8}{'quality':>8}{'avg bytes':>12}{'vs jpeg':>9}{'encode ms':>11}")
+
+    for width, height in sizes:
+        images = [resize_pixels(path, width, height, "balanced", DecodedImageCache(0)) for path in sources]
+        rows = []
+        for image_format, quality in settings:
+            results = [encoded(image, image_format, quality, args.repeat) for image in images]
+            rows.append((image_format, output_quality(image_format, quality),
+                         statistics.mean(size for size, _ in results), statistics.mean(ms for _, ms in results)))
+        baseline = rows[0][2]  # jpeg at its default quality
+        for image_format, quality, size, ms in rows:
+            print(f"{width}x{height:<6}{image_format:<8}{quality if quality is not None else '-':>8}"
+                  f"{size:>12,.0f}{size / baseline:>9.0%}{ms:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
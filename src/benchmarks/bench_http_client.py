@@ -0,0 +1,86 @@
+"""
+Per-request overhead of the gateway -> FastAPI hop: a fresh connection per call
+(module-level ``requests.get``) versus the pooled keep-alive client in
+``utils.http_client``.
+
+Run from src/:
+
+    python -m benchmarks.bench_http_client --requests 2000 --concurrency 16
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from utils import http_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like uvicorn
+    disable_nagle_algorithm = True  # uvicorn sets TCP_NODELAY too
+
+    def do_GET(self):
+        body = b'{"status": "ok"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _run(fetch, url, total, concurrency):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        started = time.perf_counter()
+        fetch(url).content
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": total / wall,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    results = {
+        "requests.get (new connection)": _run(requests.get, url, args.requests, args.concurrency),
+        "http_client.get (pooled)": _run(http_client.get, url, args.requests, args.concurrency),
+    }
+    server.shutdown()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}")
+    print(f"{'client':32} {'req/s':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:32} {r['rps']:9.0f} {r['mean_ms']:9.2f} {r['p50_ms']:9.2f} {r['p99_ms']:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
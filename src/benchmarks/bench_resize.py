@@ -0,0 +1,68 @@
+"""
+Resize presets compared on the placeholder source photos: latency of a cold
+resize (decode + resize, as on a first request for a size) and a warm one
+(decoded source already in memory), plus output quality as PSNR against the
+"best" preset. Run from src/:
+
+    python -m benchmarks.bench_resize --sizes 100x100 300x200 800x600
+"""
+import argparse
+import glob
+import math
+import statistics
+import time
+
+from PIL import ImageChops, ImageStat
+
+from utils.image_processing import RESIZE_PRESETS, DecodedImageCache, resize_pixels
+
+
+def psnr(image, reference):
+    """Peak signal-to-noise ratio in dB (higher is closer; identical images are inf)."""
+    diff = ImageChops.difference(image.convert("RGB"), reference.convert("RGB"))
+    mse = statistics.mean(rms ** 2 for rms in ImageStat.Stat(diff).rms)
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="static/*-images/*.jpg")
+    parser.add_argument("--sizes", nargs="+", default=["100x100", "300x200", "800x600"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sources = sorted(glob.glob(args.images))
+    sizes = [tuple(int(n) for n in size.split("x")) for size in args.sizes]
+    print(f"{len(sources)} source images\n")
+    print(f"{'size':<10}{'preset':<10}{'cold ms':>10}{'warm ms':>10}{'PSNR dB':>10}")
+
+    for width, height in sizes:
+        results = {preset: ([], [], []) for preset in RESIZE_PRESETS}
+        for path in sources:
+            reference = resize_pixels(path, width, height, "best", DecodedImageCache(0))
+            for preset, (cold, warm, quality) in results.items():
+                uncached = DecodedImageCache(0)  # Never stores: every call decodes
+                image, ms = timed(lambda: resize_pixels(path, width, height, preset, uncached), args.repeat)
+                cold.append(ms)
+
+                cache = DecodedImageCache()
+                resize_pixels(path, width, height, preset, cache)
+                _, ms = timed(lambda: resize_pixels(path, width, height, preset, cache), args.repeat)
+                warm.append(ms)
+                quality.append(psnr(image, reference))
+
+        for preset, (cold, warm, quality) in results.items():
+            finite = [q for q in quality if math.isfinite(q)]
+            score = f"{statistics.mean(finite):.1f}" if finite else "= best"
+            print(f"{width}x{height:<6}{preset:<10}{statistics.mean(cold):>10.2f}{statistics.mean(warm):>10.2f}{score:>10}")
+
+
+if __name__ == "__main__":
+    main()
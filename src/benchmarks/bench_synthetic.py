@@ -0,0 +1,67 @@
+"""
+Cost of a synthetic placeholder (drawn, no source file) against a photo
+placeholder of the same size: cold (decode + resize + encode, as on a first
+request), warm (decoded source already in memory) and synthetic (draw + encode).
+Run from src/:
+
+    python -m benchmarks.bench_synthetic --sizes 100x100 300x200 1200x600 --format jpeg
+"""
+import argparse
+import glob
+import io
+import statistics
+import time
+
+from utils.image_processing import OUTPUT_FORMATS, DecodedImageCache, encode_image, resize_pixels
+from utils.synthetic_images import parse_background, render_synthetic
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - started) / repeat * 1000
+
+
+def photo(path, width, height, image_format, cache):
+    buffer = io.BytesIO()
+    encode_image(resize_pixels(path, width, height, "balanced", cache), buffer, image_format)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="static/*-images/*.jpg")
+    parser.add_argument("--sizes", nargs="+", default=["100x100", "300x200", "1200x600"])
+    parser.add_argument("--format", default="jpeg", choices=list(OUTPUT_FORMATS))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sources = sorted(glob.glob(args.images))
+    sizes = [tuple(int(n) for n in size.split("x")) for size in args.sizes]
+    backgrounds = [parse_background(name) for name in ("lightgray", "steelblue", "navy-teal")]
+    print(f"{len(sources)} source images, {args.format}\n")
+    print(f"{'size':<11}{'photo cold ms':>15}{'photo warm ms':>15}{'synthetic ms':>14}{'speedup':>9}{'synthetic bytes':>17}")
+
+    for width, height in sizes:
+        cold, warm = [], []
+        for path in sources:
+            uncached = DecodedImageCache(0)  # Never stores: every call decodes
+            cold.append(timed(lambda: photo(path, width, height, args.format, uncached), args.repeat)[1])
+            cache = DecodedImageCache()
+            photo(path, width, height, args.format, cache)
+            warm.append(timed(lambda: photo(path, width, height, args.format, cache), args.repeat)[1])
+
+        drawn, sizes_out = [], []
+        for colors in backgrounds:
+            body, ms = timed(lambda: render_synthetic(colors, width, height, f"{width}x{height}", args.format), args.repeat)
+            drawn.append(ms)
+            sizes_out.append(len(body))
+
+        cold_ms, warm_ms, drawn_ms = statistics.mean(cold), statistics.mean(warm), statistics.mean(drawn)
+        print(f"{width}x{height:<7}{cold_ms:>15.2f}{warm_ms:>15.2f}{drawn_ms:>14.2f}{cold_ms / drawn_ms:>8.0f}x"
+              f"{statistics.mean(sizes_out):>17,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 import os
-import random
 import utils.helpers as helpers
+from utils.image_previews import compute_preview
+from utils.image_processing import source_digest, source_key
 from google.cloud import datastore
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone
 
+IMAGE_MAPPING_BATCH_SIZE = 500  # Datastore's limit on entities per put_multi/delete_multi
+PREVIEW_FIELDS = ("width", "height", "blurhash", "lqip")
 
 
 class model:
@@ -51,9 +54,13 @@ class model:
         return None  
     
     #  Store API Key in Datastore
-    def store_api_key(self, user_email, salt, hashed_api_key, expiration_date):
-        """Stores a new API key for the user."""
-        key = self.client.key('APIKey')
+    def store_api_key(self, user_email, salt, hashed_api_key, expiration_date, key_id=None):
+        """Stores a new API key for the user.
+
+        Keys issued with a public ``key_id`` are stored under that name so they
+        can be fetched directly with ``get_api_key``; legacy keys get a numeric id.
+        """
+        key = self.client.key('APIKey', key_id) if key_id else self.client.key('APIKey')
         entity = datastore.Entity(key)
         entity.update({
             'user_email': user_email,
@@ -77,7 +84,7 @@ class model:
     def revoke_api_key(self, user_email, api_key_id):
         """Marks an API key as revoked."""
         try:
-            key = self.client.key('APIKey', int(api_key_id))
+            key = self.client.key('APIKey', self._api_key_id(api_key_id))
             entity = self.client.get(key)
 
             if entity:
@@ -93,73 +100,110 @@ class model:
         except Exception:
             return False  # Revocation failed
     
+    @staticmethod
+    def _api_key_id(api_key_id):
+        """Legacy keys use numeric ids, prefixed keys use their lookup id as the name."""
+        api_key_id = str(api_key_id)
+        return int(api_key_id) if api_key_id.isdigit() else api_key_id
+
+    # Get a single api key by its public lookup id
+    def get_api_key(self, key_id):
+        """Fetch an API key entity by its lookup id (single keyed get)."""
+        return self.client.get(self.client.key('APIKey', key_id))
+
+    # Get the lookup ids of issued api keys
+    def get_api_key_ids(self, created_after=None):
+        """Keys-only scan of prefixed API key ids, optionally only those created after a time."""
+        query = self.client.query(kind='APIKey')
+        query.keys_only()
+        if created_after is not None:
+            query.add_filter('created_at', '>', created_after)
+        return [entity.key.name for entity in query.fetch() if entity.key.name]
+
+    # Get the ids of revoked api keys
+    def get_revoked_api_key_ids(self):
+        """Ids of revoked API keys that have not expired yet, used by the signed-key revocation set.
+
+        Expired keys are rejected on their expiry alone, so they are left out. The
+        expiry is checked here rather than in the query, which would need a
+        composite index on (revoked, expires_at).
+        """
+        query = self.client.query(kind='APIKey')
+        query.add_filter('revoked', '=', True)
+        current_time = datetime.now(timezone.utc)
+        return [str(entity.key.id_or_name) for entity in query.fetch() if entity['expires_at'] > current_time]
+
     # Get all active api keys
     def get_all_active_api_keys(self):
         """Fetch all active API keys for validation."""
         query = self.client.query(kind='APIKey')
         query.add_filter('revoked', '=', False)
         return list(query.fetch())
-    def clear_image_mappings(self):
-        """Clears existing image mappings in Datastore."""
-        query = self.client.query(kind="ImageMapping")
-        keys = [entity.key for entity in query.fetch()]
-        if keys:
-            self.client.delete_multi(keys)
-            
 
     def create_image_mappings(self):
-        """Creates image mappings by scanning static directories."""
-        self.clear_image_mappings()
-
-        category_dirs = helpers.get_category_directories()
-
-        for category, directory in category_dirs.items():
-            if not os.path.exists(directory):
-                continue
+        """Syncs image mappings with the static image directories.
 
+        Only the differences are written: mappings for new, moved or modified files
+        are put, mappings whose file is gone are deleted, in batches of
+        IMAGE_MAPPING_BATCH_SIZE. Previews (see utils.image_previews) are computed
+        for the mappings being put, so each image is only processed once.
+        Returns (added, changed, removed).
+        """
+        desired = {}
+        for category, directory in helpers.get_category_directories().items():
             for filename in os.listdir(directory):
                 if filename.endswith((".jpg", ".png", ".jpeg")):
                     name = os.path.splitext(filename)[0]
-                    key = self.client.key("ImageMapping", f"{category}-{name}")
-                    entity = datastore.Entity(key)
-                    entity.update({
+                    location = os.path.join(directory, filename)
+                    desired[f"{category}-{name}"] = {
                         "category": category,
                         "name": name,
-                        "location": os.path.join(directory, filename)
-                    })
-                    self.client.put(entity)
-
-
-    def get_image_path(self, category: str, name: str) -> str:
-        """Fetch image path from Datastore. Supports 'random' selection."""
-        category_dirs = helpers.get_category_directories()
-
-        if category not in category_dirs:
-            return None
-
-        if name == "random":
-            query = self.client.query(kind="ImageMapping")
-            query.add_filter("category", "=", category)
-            images = list(query.fetch())
-
-            if images:
-                selected_image = random.choice(images)  
-                image_path = os.path.abspath(selected_image["location"])
-                return image_path
+                        "location": location,
+                        "digest": source_digest(*source_key(location))
+                    }
+
+        existing = {entity.key.id_or_name: entity for entity in self.client.query(kind="ImageMapping").fetch()}
+
+        added, changed, upserts = 0, 0, []
+        for key_name, properties in desired.items():
+            current = existing.get(key_name)
+            # A file that failed once is retried only when its content (digest) changes
+            if (current is not None and ("blurhash" in current or current.get("preview_failed"))
+                    and all(current.get(field) == value for field, value in properties.items())):
+                continue
+            if current is None:
+                added += 1
             else:
-                return os.path.abspath(os.path.join(category_dirs[category], "default.jpg"))
-
-        key = self.client.key("ImageMapping", f"{category}-{name}")
-        entity = self.client.get(key)
+                changed += 1
+            # Previews are too long to index, and are never filtered on
+            entity = datastore.Entity(self.client.key("ImageMapping", key_name), exclude_from_indexes=("blurhash", "lqip"))
+            entity.update(properties)
+            try:
+                entity.update(compute_preview(properties["location"]))
+            except Exception as e:
+                # The mapping is still stored; only requests for this file will fail
+                print(f"Error computing preview for {properties['location']}: {e}")
+                entity["preview_failed"] = True
+            upserts.append(entity)
+
+        removals = [entity.key for key_name, entity in existing.items() if key_name not in desired]
+
+        for start in range(0, len(upserts), IMAGE_MAPPING_BATCH_SIZE):
+            self.client.put_multi(upserts[start:start + IMAGE_MAPPING_BATCH_SIZE])
+        for start in range(0, len(removals), IMAGE_MAPPING_BATCH_SIZE):
+            self.client.delete_multi(removals[start:start + IMAGE_MAPPING_BATCH_SIZE])
+
+        return added, changed, len(removals)
+
+
+    def get_image_previews(self):
+        """Previews of every mapped image: dicts with category, name, width, height, blurhash and lqip."""
+        return [
+            {"category": entity["category"], "name": entity["name"], **{field: entity[field] for field in PREVIEW_FIELDS}}
+            for entity in self.client.query(kind="ImageMapping").fetch()
+            if "blurhash" in entity
+        ]
 
-        if entity:
-            image_path = os.path.abspath(entity["location"])
-            if os.path.exists(image_path):
-                return image_path
-            else:
-                print(f"Mapped Image Not Found: {image_path}")
-        return os.path.abspath(os.path.join(category_dirs[category], "default.jpg"))
-    
     def store_weather_data(self, date, data):
         """Store weather data for a specific date in Datastore."""
         key = self.client.key('Weather', date)
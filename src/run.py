@@ -1,10 +1,36 @@
+import argparse
+import os
 import subprocess
 import time
 
+# split:    Flask gateway and FastAPI service as two processes talking over HTTP
+# cohosted: one uvicorn process serving both, FastAPI calls dispatched in-process
+# async:    FastAPI service plus the ASGI gateway (non-blocking upstream client)
+RUN_MODES = ("split", "cohosted", "async")
+
 if __name__ == "__main__":
-    fastapi_process = subprocess.Popen(["python", "-m", "uvicorn", "services.fastapi_service:app", "--host", "0.0.0.0", "--port", "8000"])
+    parser = argparse.ArgumentParser(description="Start APIverse")
+    parser.add_argument("--mode", choices=RUN_MODES, default=os.getenv("RUN_MODE", "split"))
+    args = parser.parse_args()
+    port = os.getenv("PORT", "8080")
+
+    if args.mode == "cohosted":
+        server_process = subprocess.Popen(["python", "-m", "uvicorn", "services.cohosted_service:app", "--host", "0.0.0.0", "--port", port])
+        try:
+            server_process.wait()
+        except KeyboardInterrupt:
+            server_process.terminate()
+        raise SystemExit(server_process.returncode)
+
+    # Workers share the resized image cache directory (see utils.image_cache)
+    fastapi_workers = os.getenv("FASTAPI_WORKERS", "1")
+    fastapi_process = subprocess.Popen(["python", "-m", "uvicorn", "services.fastapi_service:app", "--host", "0.0.0.0", "--port", "8000",
+                                        "--workers", fastapi_workers])
     time.sleep(10)
-    flask_process = subprocess.Popen(["python", "app.py"])
+    if args.mode == "async":
+        flask_process = subprocess.Popen(["python", "-m", "uvicorn", "services.async_gateway:app", "--host", "0.0.0.0", "--port", port])
+    else:
+        flask_process = subprocess.Popen(["python", "app.py"])
 
     try:
         flask_process.wait()
@@ -12,5 +38,3 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         fastapi_process.terminate()
         flask_process.terminate()
-
-
@@ -0,0 +1,323 @@
+"""
+ASGI gateway mode: proxied API calls are forwarded to FastAPI over a pooled
+async client, so a slow upstream (Datastore, Gemini) holds a coroutine rather
+than a worker thread.
+
+Requests are matched against the Flask app's own URL map. Endpoints listed in
+ASYNC_ROUTES are handled here with the same API key rules as the Flask views;
+every other route (pages, dashboard, docs, course generation) falls through to
+the Flask app through a WSGI bridge.
+
+Idempotent GETs (Star Wars, weather, course header, gradebook, previews) go
+through the same in-process response cache as the Flask views, under the same
+keys, so course regeneration served by the Flask app invalidates them too.
+
+    uvicorn services.async_gateway:app --host 0.0.0.0 --port 8080
+"""
+import os
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from werkzeug.exceptions import HTTPException
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # Fall back to Starlette's bridge when a2wsgi is not installed
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from utils.compression import (
+    COMPRESSION_MIN_SIZE, choose_encoding, compress, compression_stats, is_compressible, weak_etag,
+)
+from utils.helpers import api_key_error, load_gateway_app
+from utils.http_cache import etag_matches
+from utils.http_client import (
+    PASSTHROUGH_HEADERS, UPSTREAM_POOL_SIZE, UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_READ_TIMEOUT, UPSTREAM_RETRIES,
+)
+from utils.response_cache import response_cache, normalize_url, CACHED_HEADERS
+
+GATEWAY_THREADS = int(os.getenv("GATEWAY_THREADS", 40))
+STARWARS_ENTITY_TYPES = ['films', 'people', 'planets', 'species', 'starships', 'vehicles']
+
+gateway_globals = load_gateway_app()
+gateway_app = gateway_globals["app"]
+FASTAPI_URL = gateway_globals["FASTAPI_URL"]
+
+try:
+    wsgi_gateway = WSGIMiddleware(gateway_app, workers=GATEWAY_THREADS)
+except TypeError:
+    wsgi_gateway = WSGIMiddleware(gateway_app)
+
+
+def create_client():
+    """Pooled async client with the same limits and timeouts as utils.http_client."""
+    transport = httpx.AsyncHTTPTransport(
+        retries=UPSTREAM_RETRIES,
+        limits=httpx.Limits(max_connections=UPSTREAM_POOL_SIZE, max_keepalive_connections=UPSTREAM_POOL_SIZE),
+    )
+    return httpx.AsyncClient(
+        base_url=FASTAPI_URL,
+        transport=transport,
+        timeout=httpx.Timeout(UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+    )
+
+
+client = None
+
+
+async def check_api_key(apikey):
+    """Same rules as validate_api_key_request; Datastore misses run off the loop."""
+    error = await run_in_threadpool(api_key_error, apikey)
+    if error:
+        payload, status = error
+        return JSONResponse(payload, status_code=status)
+    return None
+
+
+async def forward(request, path, params=None, method="GET", content=None):
+    """Send a request upstream and stream the body back without buffering it."""
+    headers = {"Accept-Encoding": request.headers.get("Accept-Encoding", "identity")}
+    for name in ("Accept", "If-None-Match"):
+        if name in request.headers:
+            headers[name] = request.headers[name]
+    if content is not None:
+        headers["Content-Type"] = "application/json"
+    upstream = client.build_request(
+        method, path,
+        params=request.query_params if params is None else params,
+        headers=headers,
+        content=content,
+    )
+    response = await client.send(upstream, stream=True)
+    return response
+
+
+def relay(response):
+    passthrough = {name: response.headers[name] for name in PASSTHROUGH_HEADERS if name in response.headers}
+    if "Content-Encoding" in response.headers:
+        passthrough["Content-Encoding"] = response.headers["Content-Encoding"]
+    return StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        headers=passthrough,
+        background=BackgroundTask(response.aclose),
+    )
+
+
+def buffered_response(request, endpoint, body, status, headers):
+    """Response for a buffered body, compressed the way the Flask gateway's after_request hook does."""
+    headers = dict(headers)
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    if (status == 200 and encoding and len(body) >= COMPRESSION_MIN_SIZE
+            and is_compressible(headers.get("Content-Type"))):
+        compressed = compress(body, encoding)
+        compression_stats.record(endpoint, len(body), len(compressed))
+        body = compressed
+        headers["Content-Encoding"] = encoding
+        headers["Vary"] = ", ".join(filter(None, (headers.get("Vary"), "Accept-Encoding")))
+        if "ETag" in headers:
+            headers["ETag"] = weak_etag(headers["ETag"])
+    return Response(body, status_code=status, headers=headers)
+
+
+async def cached_get(request, route, path, params=None):
+    """Async counterpart of the Flask gateway's cached_get, sharing its response cache and keys."""
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    cache_key = normalize_url(f"{FASTAPI_URL}{path}", params)
+
+    cached = response_cache.get(route, cache_key)
+    if cached:
+        if etag_matches(cached.headers.get("ETag"), request.headers.get("If-None-Match")):
+            not_modified = {name: cached.headers[name] for name in ("ETag", "Cache-Control") if name in cached.headers}
+            return Response(status_code=304, headers=not_modified)
+        return buffered_response(request, route, cached.body, cached.status, cached.headers)
+
+    headers = {}
+    if "If-None-Match" in request.headers:
+        headers["If-None-Match"] = request.headers["If-None-Match"]
+    response = await client.get(path, params=params, headers=headers)
+    response_cache.store(route, cache_key, response.status_code, response.headers, response.content)
+    kept = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+    return buffered_response(request, route, response.content, response.status_code, kept)
+
+
+def first_values(query_params):
+    """The first value of each query parameter, like Flask's ``request.args.to_dict()``."""
+    return {name: query_params.getlist(name)[0] for name in query_params.keys()}
+
+
+def query_int(args, name, default):
+    """Like ``request.args.get(name, default, type=int)``: the default when missing or not an int."""
+    try:
+        return int(args[name]) if name in args else default
+    except ValueError:
+        return default
+
+
+def starwars_list_params(query_params):
+    args = first_values(query_params)
+    return {
+        "skip": query_int(args, "skip", 0),
+        "limit": query_int(args, "limit", 10),
+        "search": args.get("search"),
+        "format": args.get("format", "json"),
+    }
+
+
+def format_params(query_params):
+    return {"format": first_values(query_params).get("format", "json")}
+
+
+def cached(route, upstream_path, params=None):
+    """Handler that validates the key and serves ``upstream_path`` through the response cache.
+
+    ``params(query_params)`` builds the upstream query exactly as the Flask view
+    does, so a response cached by either gateway is found by the other.
+    """
+    async def handler(request, apikey, **values):
+        error_response = await check_api_key(apikey)
+        if error_response:
+            return error_response
+
+        query = params(request.query_params) if params else None
+        return await cached_get(request, route, upstream_path.format(**values), query)
+    return handler
+
+
+async def placeholder_image(request, category, apikey, name, width, height):
+    error_response = await check_api_key(apikey)
+    if error_response:
+        return error_response
+
+    response = await forward(request, f"/{category}/{name}/{width}/{height}/")
+    # 503 carries Retry-After when resizing is saturated; 4xx other than 404 carry FastAPI's reason
+    # for the rejection (bad format, quality, preset or synthetic image name)
+    if response.status_code in (200, 304, 503) or (400 <= response.status_code < 500 and response.status_code != 404):
+        return relay(response)
+
+    await response.aclose()
+
+    if response.status_code == 404:
+        if name == "random":  # Prevent infinite loop if even `/random/` fails
+            return JSONResponse({"error": f"No images found in category '{category}'"}, status_code=404)
+
+        query = f"?{request.url.query}" if request.url.query else ""
+        return RedirectResponse(f"/api/{category}/{apikey}/random/{width}/{height}/{query}", status_code=302)
+
+    return JSONResponse({"error": "Unexpected error from image service"}, status_code=response.status_code)
+
+
+async def batch_images(request, apikey):
+    error_response = await check_api_key(apikey)
+    if error_response:
+        return error_response
+
+    return relay(await forward(request, "/images/batch", method="POST", content=await request.body()))
+
+
+def proxy(upstream_path):
+    """Handler that validates the key and forwards the query string to ``upstream_path``."""
+    async def handler(request, apikey, **values):
+        error_response = await check_api_key(apikey)
+        if error_response:
+            return error_response
+
+        return relay(await forward(request, upstream_path.format(**values)))
+    return handler
+
+
+async def get_starwars_entity(request, entity_type, entity_id, apikey):
+    error_response = await check_api_key(apikey)
+    if error_response:
+        return error_response
+
+    entity_type_lower = entity_type.lower()
+    if entity_type_lower not in STARWARS_ENTITY_TYPES:
+        return JSONResponse({"error": f"Invalid entity type: {entity_type}"}, status_code=400)
+
+    return await cached_get(request, "starwars_entity", f"/starwars/{entity_type_lower}/{entity_id}",
+                            format_params(request.query_params))
+
+
+async def download_file(request):
+    if not request.query_params.get("file"):
+        return JSONResponse({"error": "Missing file parameter"}, status_code=400)
+
+    response = await forward(request, "/download_file", {"file": request.query_params["file"]})
+    if response.status_code == 200:
+        return relay(response)
+
+    await response.aclose()
+    return JSONResponse({"error": "File not found"}, status_code=404)
+
+
+# Flask endpoint name -> async handler. Anything not listed is served by Flask.
+ASYNC_ROUTES = {
+    "placeholder_image": placeholder_image,
+    "batch_images": batch_images,
+    "get_image_previews": cached("image_previews", "/images/{category}/previews"),
+    "get_paragraphs": proxy("/paragraphs"),
+    "download_file": download_file,
+    "get_weather_for_date": cached("weather_date", "/weather/date/", first_values),
+    "get_weather_for_month": cached("weather_month", "/weather/month/", first_values),
+    "get_course_header": cached("course_header", "/api/header/{courseId}"),
+    "get_gradebook": cached("gradebook", "/api/gradebook/{courseId}", format_params),
+    "get_starwars_films": cached("starwars_list", "/starwars/films", starwars_list_params),
+    "get_starwars_people": cached("starwars_list", "/starwars/people", starwars_list_params),
+    "get_starwars_planets": cached("starwars_list", "/starwars/planets", starwars_list_params),
+    "get_starwars_species": cached("starwars_list", "/starwars/species", starwars_list_params),
+    "get_starwars_starships": cached("starwars_list", "/starwars/starships", starwars_list_params),
+    "get_starwars_vehicles": cached("starwars_list", "/starwars/vehicles", starwars_list_params),
+    "get_starwars_entity": get_starwars_entity,
+}
+
+
+class AsyncGateway:
+    """ASGI entry point routing by the Flask URL map."""
+
+    def __init__(self):
+        self.url_adapter = gateway_app.url_map.bind("localhost")
+
+    def match(self, scope):
+        try:
+            return self.url_adapter.match(scope["path"], method=scope["method"])
+        except HTTPException:
+            return None, {}  # Let Flask produce its own 404/405/redirect
+
+    async def lifespan(self, receive, send):
+        global client
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                client = create_client()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+
+        if scope["type"] == "http":
+            endpoint, values = self.match(scope)
+            handler = ASYNC_ROUTES.get(endpoint)
+            if handler is not None:
+                request = Request(scope, receive)
+                try:
+                    response = await handler(request, **values)
+                except httpx.HTTPError as e:
+                    print(f"Error forwarding request to FastAPI: {e}")
+                    response = JSONResponse({"error": "Upstream service unavailable"}, status_code=502)
+                await response(scope, receive, send)
+                return
+
+        await wsgi_gateway(scope, receive, send)
+
+
+app = AsyncGateway()
@@ -0,0 +1,54 @@
+"""
+Single-process deployment: the Flask gateway and the FastAPI service share one
+uvicorn server.
+
+The Flask app (pages, API key validation) is served through a WSGI bridge, and its
+calls to FASTAPI_URL are dispatched in-process to the FastAPI app by ASGIAdapter,
+skipping the loopback HTTP hop. FastAPI itself is not exposed on any port.
+
+    uvicorn services.cohosted_service:app --host 0.0.0.0 --port 8080
+"""
+import asyncio
+import os
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # Fall back to Starlette's bridge when a2wsgi is not installed
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from services.fastapi_service import app as api_app
+from utils import http_client
+from utils.asgi_adapter import ASGIAdapter
+from utils.helpers import load_gateway_app
+
+GATEWAY_THREADS = int(os.getenv("GATEWAY_THREADS", 40))
+
+gateway_globals = load_gateway_app()
+gateway_app = gateway_globals["app"]
+FASTAPI_URL = gateway_globals["FASTAPI_URL"]
+
+try:
+    wsgi_gateway = WSGIMiddleware(gateway_app, workers=GATEWAY_THREADS)
+except TypeError:
+    wsgi_gateway = WSGIMiddleware(gateway_app)
+
+
+class CoHostedApp:
+    """ASGI entry point: public HTTP traffic goes to Flask, lifespan goes to FastAPI."""
+
+    def __init__(self):
+        self.mounted = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            # Bind in-process dispatch to the server's loop before serving anything
+            if not self.mounted:
+                http_client.mount(FASTAPI_URL, ASGIAdapter(api_app, asyncio.get_running_loop()))
+                self.mounted = True
+            await api_app(scope, receive, send)
+            return
+
+        await wsgi_gateway(scope, receive, send)
+
+
+app = CoHostedApp()
@@ -1,20 +1,41 @@
-from fastapi import FastAPI, Query, HTTPException, Request, Path
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+from fastapi import FastAPI, Query, HTTPException, Request, Path, Header
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 import os
-from utils.image_processing import resize_image
+from utils.image_processing import (
+    resize_etag, resize_key, negotiate_image_format, RESIZE_PRESETS, DEFAULT_RESIZE_PRESET, OUTPUT_FORMATS
+)
+from utils.image_batch import (
+    BatchVariant, BATCH_CONCURRENCY, BATCH_MAX_IMAGES, BATCH_PACKAGING,
+    multipart_boundary, multipart_stream, variant_filename, zip_stream
+)
+from utils.image_cache import disk_image_cache, memory_image_cache, image_tier_stats, IMAGE_CACHE_SCAN_INTERVAL
+from utils.image_catalog import image_catalog
+from utils.image_previews import image_previews
+from utils.synthetic_images import (
+    SYNTHETIC_CATEGORY, TEXT_MAX_LENGTH, parse_background, render_synthetic, synthetic_key
+)
+from utils.resize_pool import resize_pool, PoolSaturated, RESIZE_RETRY_AFTER
+from utils.image_warmup import (
+    access_stats, image_warmup, IMAGE_ACCESS_FLUSH_INTERVAL, IMAGE_WARMUP_BUDGET, IMAGE_WARMUP_TOP_N,
+    IMAGE_WARMUP_MAX_BUDGET, IMAGE_WARMUP_MAX_TOP_N,
+)
 from utils.paragraph_processing import generate_manual_paragraphs, generate_llm_paragraph
-from utils.file_utils import get_downloadable_file_response, save_file
+from utils.file_utils import get_downloadable_file_response, save_file, read_file
 from utils.html_utils import generate_html_page, generate_download_page
 from model.model_datastore import model
 from utils.helpers import cleanup_old_files
+from utils.http_cache import CacheControlMiddleware, compute_etag, etag_matches, not_modified
+from utils.compression import CompressionMiddleware, PrecompressedStaticFiles, compression_stats, precompress_static
+from fastapi.encoders import jsonable_encoder
 from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 import asyncio
+import hmac
 from services.weather_service import get_weather_for_date, get_weather_for_month
 from datetime import datetime
 from services.gradebook_service import create_course, get_course_header, get_students_by_course
-from fastapi.staticfiles import StaticFiles
 from fastapi.openapi.docs import get_swagger_ui_html
 from services.starwars_service import (
     get_films, get_people, get_planets, get_species, get_starships, get_vehicles,
@@ -22,13 +43,27 @@ from services.starwars_service import (
 )
 
 db = model()
+IMAGE_WATCH_INTERVAL = float(os.getenv("IMAGE_WATCH_INTERVAL", 0))  # seconds; 0 disables the watcher
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handles FastAPI startup & shutdown events."""
     
-    db.create_image_mappings()
-    print("Image mappings created successfully.")
+    precompress_static("static")  # No-op when the image build already did it
+
+    # With several uvicorn workers on one cache directory, one of them cleans up and evicts
+    disk_image_cache.claim_ownership()
+    disk_image_cache.scan()  # Resized images persist across restarts
+    resize_pool.start()
+
+    image_catalog.refresh()
+    await sync_image_mappings()
+
+    # Pre-render the most requested sizes in the background so early users hit the cache
+    await run_in_threadpool(access_stats.load)
+    if IMAGE_WARMUP_TOP_N > 0 and disk_image_cache.owner:
+        image_warmup.start()
 
     # Check if Star Wars data exists, import if needed
     if not check_starwars_data_exists():
@@ -40,15 +75,81 @@ async def lifespan(app: FastAPI):
         
     # Start cleanup scheduler in the background
     task = asyncio.create_task(cleanup_scheduler())
+    watcher = asyncio.create_task(image_watcher()) if IMAGE_WATCH_INTERVAL > 0 else None
+    flusher = asyncio.create_task(access_stats_flusher())
+    maintenance = asyncio.create_task(image_cache_maintenance())
 
     yield  
 
     task.cancel()  
+    if watcher:
+        watcher.cancel()
+    flusher.cancel()
+    maintenance.cancel()
+    if image_warmup.task:
+        image_warmup.task.cancel()
+    await run_in_threadpool(access_stats.flush)
+    resize_pool.shutdown()
+
+async def sync_image_mappings():
+    """Sync the Datastore image mappings (computing previews of new images) and reload the previews.
+
+    With several workers only the cache owner writes the mappings; the others just
+    reload the previews, and pick up the owner's later ones in image_cache_maintenance.
+    """
+    if disk_image_cache.owner:
+        added, changed, removed = await run_in_threadpool(db.create_image_mappings)
+        print(f"Image mappings synced: {added} added, {changed} changed, {removed} removed.")
+    image_previews.replace(await run_in_threadpool(db.get_image_previews))
+
+async def image_watcher():
+    """Picks up added or removed images without a restart (IMAGE_WATCH_INTERVAL > 0)."""
+    synced = image_catalog.signature
+    while True:
+        await asyncio.sleep(IMAGE_WATCH_INTERVAL)
+        signature = image_catalog.folder_signature()
+        if signature == synced:
+            continue
+        if signature != image_catalog.signature:
+            image_catalog.refresh()
+        try:
+            await sync_image_mappings()
+            synced = signature
+        except Exception as e:
+            print(f"Error syncing image mappings: {e}")
+
+async def access_stats_flusher():
+    """Persists placeholder request counts every IMAGE_ACCESS_FLUSH_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(IMAGE_ACCESS_FLUSH_INTERVAL)
+        try:
+            await run_in_threadpool(access_stats.flush)
+        except OSError as e:
+            print(f"Error saving image access stats: {e}")
+
+async def image_cache_maintenance():
+    """Rescans the shared image cache (owner) or takes over ownership if its owner exited.
+
+    Workers that don't own the cache also reload the image previews, which the
+    owner may still have been computing when they started.
+    """
+    while True:
+        await asyncio.sleep(IMAGE_CACHE_SCAN_INTERVAL)
+        try:
+            await run_in_threadpool(disk_image_cache.maintain)
+        except OSError as e:
+            print(f"Error maintaining image cache: {e}")
+        if not disk_image_cache.owner:
+            try:
+                image_previews.replace(await run_in_threadpool(db.get_image_previews))
+            except Exception as e:
+                print(f"Error reloading image previews: {e}")
 
 async def cleanup_scheduler():
-    """Runs cleanup every 1 hour asynchronously."""
+    """Runs cleanup every 1 hour asynchronously (in the cache owner only, when there are several workers)."""
     while True:
-        cleanup_old_files("static/downloads", "html")  
+        if disk_image_cache.owner:
+            cleanup_old_files("static/downloads", "html")  
         await asyncio.sleep(3600)  
 
 # API description for documentation
@@ -87,6 +188,10 @@ app = FastAPI(
     }
 )
 
+# Mark idempotent data responses cacheable so the gateway and clients can reuse them
+app.add_middleware(CacheControlMiddleware)
+app.add_middleware(CompressionMiddleware)
+
 # Define Pydantic models for API documentation
 
 class ParagraphResponse(BaseModel):
@@ -130,6 +235,19 @@ class CourseCreateRequest(BaseModel):
     discussionWeight: int = Field(30, description="Discussion percentage weight", ge=0)
     examWeight: int = Field(30, description="Exam percentage weight", ge=0)
 
+class BatchImageSpec(BaseModel):
+    category: str = Field(..., description="Image category")
+    name: str = Field(..., description="Specific image name or 'random'")
+    width: int = Field(..., description="Image width in pixels", gt=0, le=2000)
+    height: int = Field(..., description="Image height in pixels", gt=0, le=2000)
+    preset: str = Field(DEFAULT_RESIZE_PRESET, description="Resize quality: fast, balanced or best")
+    format: Optional[str] = Field(None, description="Output format. Default: from the Accept header")
+    quality: Optional[int] = Field(None, description="Encoder quality (ignored for png)", ge=1, le=100)
+    text: Optional[str] = Field(None, description="Label for synthetic images", max_length=TEXT_MAX_LENGTH)
+
+class BatchImageRequest(BaseModel):
+    images: List[BatchImageSpec] = Field(..., description="Variants to render", min_length=1, max_length=BATCH_MAX_IMAGES)
+
 class CourseCreateResponse(BaseModel):
     message: str = Field(..., description="Success message")
     courseId: str = Field(..., description="Course identifier of created course")
@@ -188,7 +306,7 @@ class StarWarsSpecies(BaseModel):
     tags=["Images"],
     summary="Get placeholder image",
     responses={
-        200: {"content": {"image/jpeg": {}}}, 
+        200: {"content": {media_type: {} for _, media_type, _, _, _ in OUTPUT_FORMATS.values()}},
         404: {"description": "Image not found"}
     }
 )
@@ -196,13 +314,29 @@ async def get_placeholder_image(
     category: str = Path(..., description="Image category (e.g., 'cats', 'nature')"),
     name: str = Path(..., description="Specific image name or 'random'"),
     width: int = Path(..., description="Image width in pixels", gt=0, le=2000),
-    height: int = Path(..., description="Image height in pixels", gt=0, le=2000)
+    height: int = Path(..., description="Image height in pixels", gt=0, le=2000),
+    preset: str = Query(DEFAULT_RESIZE_PRESET, description="Resize quality: fast, balanced or best"),
+    format: Optional[str] = Query(None, description=f"Output format: {', '.join(OUTPUT_FORMATS)}. Default: from the Accept header"),
+    quality: Optional[int] = Query(None, ge=1, le=100, description="Encoder quality (ignored for png)"),
+    text: Optional[str] = Query(None, max_length=TEXT_MAX_LENGTH, description="Label for synthetic images. Default: WIDTHxHEIGHT; empty for none"),
+    accept: Optional[str] = Header(None, include_in_schema=False),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Retrieve a resized placeholder image.
     
     The image will be resized to the specified dimensions while maintaining aspect ratio.
     Use 'random' as the name parameter to get a random image from the specified category.
+    The optional `preset` trades speed for quality: `fast` and `balanced` let the JPEG
+    decoder downscale while decoding, `best` decodes at full size.
+
+    Without `format`, the smallest format the client's Accept header lists is used
+    (AVIF, then WebP), falling back to progressive JPEG. `quality` overrides the
+    format's default encoder quality.
+
+    The `synthetic` category draws a box instead of resizing a photo. Its name is a
+    color (`gray`, `ff8800`), two colors for a gradient (`navy-teal`) or `random`,
+    and `text` sets the label.
     
     Current Available Categories:
     - cat
@@ -210,17 +344,225 @@ async def get_placeholder_image(
     - dog
     - pup
     - kitten
+    - synthetic
     
     *Note:* In the actual API, this endpoint is called with an API key in the path:
     /api/{category}/{apikey}/{name}/{width}/{height}/
     """
-    image_path = db.get_image_path(category, name)
+    if preset not in RESIZE_PRESETS:
+        raise HTTPException(status_code=400, detail=f"Invalid preset. Use one of: {', '.join(RESIZE_PRESETS)}")
+    if format is None:
+        image_format = negotiate_image_format(accept)
+        headers = {"Vary": "Accept"}  # Caches must key the negotiated response on Accept
+    elif format.lower() in OUTPUT_FORMATS:
+        image_format = format.lower()
+        headers = {}
+    else:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Use one of: {', '.join(OUTPUT_FORMATS)}")
+    media_type = OUTPUT_FORMATS[image_format][1]
+
+    if category == SYNTHETIC_CATEGORY:
+        colors = synthetic_colors(name)
+        label = f"{width}x{height}" if text is None else text
+        key = synthetic_key(colors, width, height, label, image_format, quality)
+        etag = resize_etag(key)
+        if etag_matches(etag, if_none_match):
+            response = not_modified(etag)
+            response.headers.update(headers)
+            return response
+        body, etag = await render_synthetic_image(key, colors, width, height, label, image_format, quality)
+        return Response(body, media_type=media_type, headers={**headers, "ETag": etag})
+
+    # In-memory catalog: no Datastore call or directory listing per request
+    image_path = image_catalog.get_image_path(category, name)
     
-    if not image_path or not os.path.exists(image_path):
+    if not image_path:
         raise HTTPException(status_code=404, detail="Image not found")
+    access_stats.record(category, name, width, height, preset, image_format, quality)
+
+    # Validator from the source file's content and the output settings; no resize on a match
+    key = resize_key(image_path, width, height, preset, image_format, quality, await catalog_digest(image_path))
+    etag = resize_etag(key)
+    if etag_matches(etag, if_none_match):
+        response = not_modified(etag)
+        response.headers.update(headers)
+        return response
+
+    try:
+        body, etag = await render_image(key, image_path, width, height, preset, image_format, quality)
+    except PoolSaturated:
+        raise HTTPException(status_code=503, detail="Image service is busy, try again shortly",
+                            headers={"Retry-After": str(RESIZE_RETRY_AFTER)})
+    return Response(body, media_type=media_type, headers={**headers, "ETag": etag})
+
+async def catalog_digest(image_path):
+    """Source digest of a catalog image, memoized per catalog snapshot; hashed off the loop the first time."""
+    return image_catalog.cached_digest(image_path) or await run_in_threadpool(image_catalog.digest, image_path)
+
+async def render_image(key, image_path, width, height, preset, image_format, quality):
+    """Encoded bytes and ETag of a resized image: from memory, then the disk cache, else resized.
+
+    Raises PoolSaturated when the resize pool is full.
+    """
+    cached = memory_image_cache.get(key)
+    if cached:
+        return cached
+
+    # The disk lookup stats and touches the file, so it runs off the event loop
+    resized_image = await run_in_threadpool(disk_image_cache.get, key)
+    try:
+        if resized_image is None:
+            resized_image = await resize_pool.resize(image_path, width, height, preset, image_format, quality)
+            body = await run_in_threadpool(read_file, resized_image)
+            disk_image_cache.add(key, len(body))
+        else:
+            body = await run_in_threadpool(read_file, resized_image)
+    except FileNotFoundError:
+        # Evicted by the cache owner (another worker) between lookup and read; produce it again
+        resized_image = await resize_pool.resize(image_path, width, height, preset, image_format, quality)
+        body = await run_in_threadpool(read_file, resized_image)
+        disk_image_cache.add(key, len(body))
+    etag = resize_etag(key)
+    memory_image_cache.put(key, body, etag)
+    return body, etag
+
+def synthetic_colors(name):
+    try:
+        return parse_background(name)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid synthetic image name. "
+                                                    "Use a color (gray, ff8800) or two colors (navy-teal)")
+
+async def render_synthetic_image(key, colors, width, height, text, image_format, quality):
+    """Encoded bytes and ETag of a synthetic image: from memory, else drawn (no disk cache; drawing is cheap)."""
+    cached = memory_image_cache.get(key)
+    if cached:
+        return cached
+
+    body = await run_in_threadpool(render_synthetic, colors, width, height, text, image_format, quality)
+    etag = resize_etag(key)
+    memory_image_cache.put(key, body, etag)
+    return body, etag
 
-    resized_image = resize_image(image_path, width, height)
-    return FileResponse(resized_image, media_type="image/jpeg")
+@app.post(
+    "/images/batch",
+    tags=["Images"],
+    summary="Get many placeholder images in one response",
+    responses={
+        200: {"content": {"application/zip": {}, "multipart/mixed": {}}},
+        400: {"description": "Invalid preset or format"}
+    }
+)
+async def get_placeholder_images_batch(
+    batch: BatchImageRequest,
+    packaging: str = Query("zip", description="Response packaging: zip or multipart"),
+    accept: Optional[str] = Header(None, include_in_schema=False)
+):
+    """
+    Render up to 100 placeholder variants, e.g. every size of a responsive `srcset`.
+
+    Each spec takes the same options as the single-image endpoint. Variants are
+    resized in parallel and streamed as each one finishes, so parts arrive out of
+    order: file names start with the spec's index (`007-cat-random-300x200.webp`).
+    Variants that could not be produced are listed in `manifest.json` (zip) or sent
+    as `application/json` parts (multipart) instead of failing the whole batch.
+
+    *Note:* In the actual API, this endpoint is called with an API key in the path:
+    /api/images/batch/{apikey}
+    """
+    if packaging not in BATCH_PACKAGING:
+        raise HTTPException(status_code=400, detail=f"Invalid packaging. Use one of: {', '.join(BATCH_PACKAGING)}")
+    negotiated = negotiate_image_format(accept)
+    specs = []
+    for index, spec in enumerate(batch.images):
+        image_format = spec.format.lower() if spec.format else negotiated
+        if spec.preset not in RESIZE_PRESETS or image_format not in OUTPUT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Invalid preset or format in image {index}")
+        specs.append((index, spec, image_format))
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def render(index, spec, image_format):
+        filename = variant_filename(index, spec.category, spec.name, spec.width, spec.height,
+                                    OUTPUT_FORMATS[image_format][2])
+        media_type = OUTPUT_FORMATS[image_format][1]
+        try:
+            return await render_variant(index, spec, image_format, filename, media_type)
+        except Exception as e:
+            # One bad source must not end the stream for every other variant
+            print(f"Error rendering batch image {index} ({spec.category}/{spec.name}): {e}")
+            return BatchVariant(index, filename, media_type, None, None, {"status": 500, "error": "Image could not be produced"})
+
+    async def render_variant(index, spec, image_format, filename, media_type):
+        if spec.category == SYNTHETIC_CATEGORY:
+            try:
+                colors = synthetic_colors(spec.name)
+            except HTTPException as e:
+                return BatchVariant(index, filename, media_type, None, None, {"status": 400, "error": e.detail})
+            label = f"{spec.width}x{spec.height}" if spec.text is None else spec.text
+            key = synthetic_key(colors, spec.width, spec.height, label, image_format, spec.quality)
+            async with limit:
+                body, etag = await render_synthetic_image(key, colors, spec.width, spec.height,
+                                                          label, image_format, spec.quality)
+            return BatchVariant(index, filename, media_type, body, etag, None)
+
+        image_path = image_catalog.get_image_path(spec.category, spec.name)
+        if not image_path:
+            return BatchVariant(index, filename, media_type, None, None, {"status": 404, "error": "Image not found"})
+        access_stats.record(spec.category, spec.name, spec.width, spec.height, spec.preset, image_format, spec.quality)
+        async with limit:
+            try:
+                key = resize_key(image_path, spec.width, spec.height, spec.preset, image_format, spec.quality,
+                                 await catalog_digest(image_path))
+                body, etag = await render_image(key, image_path, spec.width, spec.height,
+                                                spec.preset, image_format, spec.quality)
+            except PoolSaturated:
+                return BatchVariant(index, filename, media_type, None, None,
+                                    {"status": 503, "error": "Image service is busy, try again shortly"})
+        return BatchVariant(index, filename, media_type, body, etag, None)
+
+    async def variants():
+        tasks = [asyncio.ensure_future(render(*spec)) for spec in specs]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()  # Client went away; resizes already submitted still complete and are cached
+
+    if packaging == "multipart":
+        boundary = multipart_boundary()
+        return StreamingResponse(multipart_stream(variants(), boundary), media_type=f"multipart/mixed; boundary={boundary}")
+    return StreamingResponse(zip_stream(variants()), media_type="application/zip",
+                             headers={"Content-Disposition": 'attachment; filename="images.zip"'})
+
+@app.get(
+    "/images/{category}/previews",
+    tags=["Images"],
+    summary="Get previews of every image in a category",
+    responses={404: {"description": "Category not found"}}
+)
+async def get_image_previews(
+    category: str = Path(..., description="Image category (e.g., 'cat', 'nature')"),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
+):
+    """
+    Tiny previews to show while placeholder images load, for every image in a category.
+
+    Each entry has the image's `name`, its original `width` and `height` (for the
+    aspect ratio), a [BlurHash](https://blurha.sh) string and `lqip`, a ~32px JPEG
+    as a base64 `data:` URI usable directly as an `<img src>`.
+
+    *Note:* In the actual API, this endpoint is called with an API key in the path:
+    /api/previews/{apikey}/{category}
+    """
+    image_catalog.check()
+    if category not in image_catalog.snapshot.images:
+        raise HTTPException(status_code=404, detail="Category not found")
+
+    images, etag = image_previews.get(category)
+    if etag_matches(etag, if_none_match):
+        return not_modified(etag)
+    return JSONResponse(content={"category": category, "images": images}, headers={"ETag": etag})
 
 # Paragraph generator API
 @app.get(
@@ -319,7 +661,8 @@ async def weather_by_date(
     format: str = Query("json", description="Output format", 
                        examples={"json": {"value": "json"},
                                  "html": {"value": "html"}, 
-                                 "download": {"value": "download"}})
+                                 "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Retrieve weather data for a specific date.
@@ -341,7 +684,7 @@ async def weather_by_date(
     /api/weather/date/{apikey}?date=2023-07-15&format=json
     """
     date = date or datetime.now().strftime("%Y-%m-%d")
-    return get_weather_for_date(date, format)
+    return get_weather_for_date(date, format, if_none_match)
 
 # Weather API - Monthly
 @app.get(
@@ -358,7 +701,8 @@ async def weather_by_month(
     format: str = Query("json", description="Output format", 
                        examples={"json": {"value": "json"},
                                  "html": {"value": "html"}, 
-                                 "download": {"value": "download"}})
+                                 "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Retrieve weather data for an entire month.
@@ -380,7 +724,7 @@ async def weather_by_month(
     /api/weather/month/{apikey}?month=2023-07&format=json
     """
     month = month or datetime.now().strftime("%Y-%m")
-    return get_weather_for_month(month, format)
+    return get_weather_for_month(month, format, if_none_match)
 
 # Course generation API
 @app.post(
@@ -530,7 +874,8 @@ async def get_gradebook(
     format: str = Query("json", description="Output format", 
                        examples={"json": {"value": "json"},
                                  "html": {"value": "html"}, 
-                                 "download": {"value": "download"}})
+                                 "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Retrieve gradebook data for a specific course.
@@ -556,8 +901,13 @@ async def get_gradebook(
     if not course:
         raise HTTPException(status_code=404, detail=f"Course {courseId} not found.")
 
+    # Validator from the course data itself, checked before any HTML is rendered
+    etag = compute_etag(format, course, students)
+    if format != "download" and etag_matches(etag, if_none_match):
+        return not_modified(etag)
+
     if format == "json":
-        return students
+        return JSONResponse(content=jsonable_encoder(students), headers={"ETag": etag})
 
     gradebook_styles = {
         "body": "font-family: Arial, sans-serif; margin: 20px; background-color: #f4f4f4;",
@@ -613,7 +963,7 @@ async def get_gradebook(
         file_path = save_file(content=html_content, file_extension="html", folder="static/downloads")
         return HTMLResponse(content=generate_download_page("Your Gradebook HTML", file_path, f"{courseId}_gradebook.html", gradebook_styles))
 
-    return HTMLResponse(content=html_content)
+    return HTMLResponse(content=html_content, headers={"ETag": etag})
 
 # Star Wars API endpoints
 @app.get(
@@ -632,7 +982,8 @@ async def starwars_films(
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                  "html": {"value": "html"}, 
-                                 "download": {"value": "download"}})
+                                 "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get Star Wars films with pagination and optional search.
@@ -645,7 +996,7 @@ async def starwars_films(
     *Note:* In the actual API, this endpoint is called with an API key in the path:
     /api/starwars/films/{apikey}?skip=0&limit=10&search=hope&format=json
     """
-    return await get_films(skip, limit, search, format)
+    return await get_films(skip, limit, search, format, if_none_match)
 
 @app.get(
     "/starwars/people",
@@ -663,7 +1014,8 @@ async def starwars_people(
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                   "html": {"value": "html"}, 
-                                  "download": {"value": "download"}})
+                                  "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get Star Wars people with pagination and optional search.
@@ -676,7 +1028,7 @@ async def starwars_people(
     *Note:* In the actual API, this endpoint is called with an API key in the path:
     /api/starwars/people/{apikey}?skip=0&limit=10&search=luke&format=json
     """
-    return await get_people(skip, limit, search, format)
+    return await get_people(skip, limit, search, format, if_none_match)
 
 @app.get(
     "/starwars/people/{person_id}",
@@ -693,7 +1045,8 @@ async def starwars_person_by_id(
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                   "html": {"value": "html"}, 
-                                  "download": {"value": "download"}})
+                                  "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get details for a specific Star Wars character by ID.
@@ -704,7 +1057,7 @@ async def starwars_person_by_id(
     *Note:* In the actual API, this endpoint is called with an API key in the path:
     /api/starwars/people/{person_id}/{apikey}?format=json
     """
-    return await get_person_by_id(person_id, format)
+    return await get_person_by_id(person_id, format, if_none_match)
 
 @app.get(
     "/starwars/planets",
@@ -722,7 +1075,8 @@ async def starwars_planets(
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                   "html": {"value": "html"}, 
-                                  "download": {"value": "download"}})
+                                  "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get Star Wars planets with pagination and optional search.
@@ -735,7 +1089,7 @@ async def starwars_planets(
     *Note:* In the actual API, this endpoint is called with an API key in the path:
     /api/starwars/planets/{apikey}?skip=0&limit=10&search=tatooine&format=json
     """
-    return await get_planets(skip, limit, search, format)
+    return await get_planets(skip, limit, search, format, if_none_match)
 
 @app.get(
     "/starwars/species",
@@ -753,7 +1107,8 @@ async def starwars_species(
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                   "html": {"value": "html"}, 
-                                  "download": {"value": "download"}})
+                                  "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get Star Wars species with pagination and optional search.
@@ -766,7 +1121,7 @@ async def starwars_species(
     *Note:* In the actual API, this endpoint is called with an API key in the path:
     /api/starwars/species/{apikey}?skip=0&limit=10&search=wookie&format=json
     """
-    return await get_species(skip, limit, search, format)
+    return await get_species(skip, limit, search, format, if_none_match)
 
 @app.get(
     "/starwars/species/{species_id}",
@@ -783,7 +1138,8 @@ async def starwars_species_by_id(
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                   "html": {"value": "html"}, 
-                                  "download": {"value": "download"}})
+                                  "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get details for a specific Star Wars species by ID.
@@ -794,7 +1150,7 @@ async def starwars_species_by_id(
     *Note:* In the actual API, this endpoint is called with an API key in the path:
     /api/starwars/species/{species_id}/{apikey}?format=json
     """
-    return await get_species_by_id(species_id, format)
+    return await get_species_by_id(species_id, format, if_none_match)
 
 @app.get(
     "/starwars/starships",
@@ -812,7 +1168,8 @@ async def starwars_starships(
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                   "html": {"value": "html"}, 
-                                  "download": {"value": "download"}})
+                                  "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get Star Wars starships with pagination and optional search.
@@ -825,7 +1182,7 @@ async def starwars_starships(
     *Note:* In the actual API, this endpoint is called with an API key in the path:
     /api/starwars/starships/{apikey}?skip=0&limit=10&search=falcon&format=json
     """
-    return await get_starships(skip, limit, search, format)
+    return await get_starships(skip, limit, search, format, if_none_match)
 
 @app.get(
     "/starwars/vehicles",
@@ -843,7 +1200,8 @@ async def starwars_vehicles(
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                   "html": {"value": "html"}, 
-                                  "download": {"value": "download"}})
+                                  "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get Star Wars vehicles with pagination and optional search.
@@ -856,7 +1214,7 @@ async def starwars_vehicles(
     *Note:* In the actual API, this endpoint is called with an API key in the path:
     /api/starwars/vehicles/{apikey}?skip=0&limit=10&search=speeder&format=json
     """
-    return await get_vehicles(skip, limit, search, format)
+    return await get_vehicles(skip, limit, search, format, if_none_match)
 
 @app.get(
     "/starwars/vehicles/{vehicle_id}",
@@ -873,7 +1231,8 @@ async def starwars_vehicle_by_id(
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                   "html": {"value": "html"}, 
-                                  "download": {"value": "download"}})
+                                  "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get details for a specific Star Wars vehicle by ID.
@@ -884,7 +1243,7 @@ async def starwars_vehicle_by_id(
     *Note:* In the actual API, this endpoint is called with an API key in the path:
     /api/starwars/vehicles/{vehicle_id}/{apikey}?format=json
     """
-    return await get_vehicle_by_id(vehicle_id, format)
+    return await get_vehicle_by_id(vehicle_id, format, if_none_match)
 
 @app.get(
     "/starwars/films/{film_id}",
@@ -901,7 +1260,8 @@ async def starwars_film_by_id(
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                  "html": {"value": "html"}, 
-                                 "download": {"value": "download"}})
+                                 "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get details for a specific Star Wars film by ID.
@@ -913,14 +1273,15 @@ async def starwars_film_by_id(
     `/api/starwars/films/{film_id}/{apikey}?format=json`
     """
 
-    return await get_film_by_id(film_id, format)
+    return await get_film_by_id(film_id, format, if_none_match)
 
 async def starwars_planet_by_id(
     planet_id: int = Path(..., description="The ID of the planet to retrieve"),
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                   "html": {"value": "html"}, 
-                                  "download": {"value": "download"}})
+                                  "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get details for a specific Star Wars planet by ID.
@@ -932,14 +1293,15 @@ async def starwars_planet_by_id(
     `/api/starwars/planets/{planet_id}/{apikey}?format=json`
     """
 
-    return await get_planet_by_id(planet_id, format)
+    return await get_planet_by_id(planet_id, format, if_none_match)
 
 async def starwars_starship_by_id(
     starship_id: int = Path(..., description="The ID of the starship to retrieve"),
     format: str = Query("json", description="Output format", 
                         examples={"json": {"value": "json"},
                                   "html": {"value": "html"}, 
-                                  "download": {"value": "download"}})
+                                  "download": {"value": "download"}}),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Get details for a specific Star Wars starship by ID.
@@ -951,11 +1313,11 @@ async def starwars_starship_by_id(
     `/api/starwars/starships/{starship_id}/{apikey}?format=json`
     """
  
-    return await get_starship_by_id(starship_id, format)
+    return await get_starship_by_id(starship_id, format, if_none_match)
 
 
 # Static files and custom Swagger UI
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 @app.get("/docs", include_in_schema=False)
 async def custom_swagger_ui():
@@ -966,4 +1328,42 @@ async def custom_swagger_ui():
         swagger_ui_parameters={"tryItOutEnabled": True},  # Keep "Try it out"
         swagger_js_url="/static/swagger-ui-bundle.js",
         swagger_css_url="/static/swagger-ui.css"
-    )
\ No newline at end of file
+    )
+
+@app.get("/internal/stats", include_in_schema=False)
+async def service_stats():
+    """Service-side counters, read by the gateway's /internal/stats."""
+    return {
+        "compression": compression_stats.stats(),
+        "decoded_images": resize_pool.decoded_image_stats(),
+        "memory_images": memory_image_cache.stats(),
+        "disk_images": disk_image_cache.stats(),
+        "image_tiers": image_tier_stats(),
+        "image_catalog": image_catalog.stats(),
+        "image_previews": image_previews.stats(),
+        "resize_pool": resize_pool.stats(),
+        "warmup": image_warmup.stats()
+    }
+
+def require_admin_token(token):
+    """Hide admin triggers unless X-Admin-Token matches ADMIN_TOKEN, as the gateway's /internal/stats does."""
+    if not ADMIN_TOKEN or not hmac.compare_digest(token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=404, detail="Not found")
+
+@app.post("/internal/catalog/refresh", include_in_schema=False)
+async def refresh_image_catalog(x_admin_token: Optional[str] = Header(None)):
+    """Rebuild the image catalog now, e.g. after copying new images in."""
+    require_admin_token(x_admin_token)
+    await run_in_threadpool(image_catalog.refresh)
+    return image_catalog.stats()
+
+@app.post("/internal/warmup", include_in_schema=False)
+async def start_image_warmup(
+    top_n: int = Query(IMAGE_WARMUP_TOP_N, ge=1, le=IMAGE_WARMUP_MAX_TOP_N),
+    budget: float = Query(IMAGE_WARMUP_BUDGET, gt=0, le=IMAGE_WARMUP_MAX_BUDGET, description="Seconds of resizing"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Pre-render the most requested placeholder outputs now, in the background."""
+    require_admin_token(x_admin_token)
+    started = image_warmup.start(top_n, budget)
+    return JSONResponse(image_warmup.stats(), status_code=202 if started else 409)
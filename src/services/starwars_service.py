@@ -2,6 +2,7 @@ from fastapi import FastAPI, Query, HTTPException
 from fastapi.responses import JSONResponse, HTMLResponse
 from model.model_datastore import model
 from utils.caching import cache_response
+from utils.http_cache import compute_etag, conditional_response
 from utils.html_utils import generate_html_page, generate_download_page
 from utils.file_utils import save_file
 from typing import Optional
@@ -73,16 +74,13 @@ def generate_random_data(entity_type, field_name):
     return "unknown"
 
 # Generic function to get entities of any type
-async def get_entities(kind, skip=0, limit=10, search=None, format="json"):
+async def get_entities(kind, skip=0, limit=10, search=None, format="json", if_none_match=None):
     """Generic function to get Star Wars entities with pagination."""
     cache_key = f"starwars:{kind}:{skip}:{limit}:{search}:{format}"
     cached_data = cache_response.get(cache_key)
     
     if cached_data:
-        if format == "json":
-            return JSONResponse(content=cached_data)
-        elif format in ["html", "download"]:
-            return generate_entity_html_response(cached_data, kind, format)
+        return entities_response(cached_data, kind, format, if_none_match)
     
     results = db.get_starwars_entities(kind, limit, skip, search)
     
@@ -94,22 +92,27 @@ async def get_entities(kind, skip=0, limit=10, search=None, format="json"):
     
     cache_response.set(cache_key, results, expire=3600)
     
+    return entities_response(results, kind, format, if_none_match)
+
+def entities_response(data, kind, format, if_none_match=None):
+    """Render an entity list, or 304 if the client's ETag still matches the data."""
     if format == "json":
-        return JSONResponse(content=results)
-    elif format in ["html", "download"]:
-        return generate_entity_html_response(results, kind, format)
+        return conditional_response(compute_etag(format, data), if_none_match,
+                                    lambda: JSONResponse(content=data))
+    elif format == "html":
+        return conditional_response(compute_etag(format, data), if_none_match,
+                                    lambda: generate_entity_html_response(data, kind, format))
+    elif format == "download":
+        return generate_entity_html_response(data, kind, format)
 
 # Generic function to get a single entity by ID
-async def get_entity_by_id(kind, entity_id, format="json"):
+async def get_entity_by_id(kind, entity_id, format="json", if_none_match=None):
     """Generic function to get a specific Star Wars entity by ID."""
     cache_key = f"starwars:{kind}:{entity_id}:{format}"
     cached_data = cache_response.get(cache_key)
     
     if cached_data:
-        if format == "json":
-            return JSONResponse(content=cached_data)
-        elif format in ["html", "download"]:
-            return generate_entity_detail_html_response(cached_data, kind, format)
+        return entity_response(cached_data, kind, format, if_none_match)
     
     entity = db.get_starwars_entity(kind, entity_id)
     
@@ -123,47 +126,55 @@ async def get_entity_by_id(kind, entity_id, format="json"):
     
     cache_response.set(cache_key, entity, expire=3600)
     
+    return entity_response(entity, kind, format, if_none_match)
+
+def entity_response(entity, kind, format, if_none_match=None):
+    """Render a single entity, or 304 if the client's ETag still matches the data."""
     if format == "json":
-        return JSONResponse(content=entity)
-    elif format in ["html", "download"]:
+        return conditional_response(compute_etag(format, entity), if_none_match,
+                                    lambda: JSONResponse(content=entity))
+    elif format == "html":
+        return conditional_response(compute_etag(format, entity), if_none_match,
+                                    lambda: generate_entity_detail_html_response(entity, kind, format))
+    elif format == "download":
         return generate_entity_detail_html_response(entity, kind, format)
 
 # Specific entity type functions
-async def get_films(skip=0, limit=10, search=None, format="json"):
-    return await get_entities("Film", skip, limit, search, format)
+async def get_films(skip=0, limit=10, search=None, format="json", if_none_match=None):
+    return await get_entities("Film", skip, limit, search, format, if_none_match)
 
-async def get_film_by_id(film_id, format="json"):
-    return await get_entity_by_id("Film", film_id, format)
+async def get_film_by_id(film_id, format="json", if_none_match=None):
+    return await get_entity_by_id("Film", film_id, format, if_none_match)
 
-async def get_people(skip=0, limit=10, search=None, format="json"):
-    return await get_entities("Person", skip, limit, search, format)
+async def get_people(skip=0, limit=10, search=None, format="json", if_none_match=None):
+    return await get_entities("Person", skip, limit, search, format, if_none_match)
 
-async def get_person_by_id(person_id, format="json"):
-    return await get_entity_by_id("Person", person_id, format)
+async def get_person_by_id(person_id, format="json", if_none_match=None):
+    return await get_entity_by_id("Person", person_id, format, if_none_match)
 
-async def get_planets(skip=0, limit=10, search=None, format="json"):
-    return await get_entities("Planet", skip, limit, search, format)
+async def get_planets(skip=0, limit=10, search=None, format="json", if_none_match=None):
+    return await get_entities("Planet", skip, limit, search, format, if_none_match)
 
-async def get_planet_by_id(planet_id, format="json"):
-    return await get_entity_by_id("Planet", planet_id, format)
+async def get_planet_by_id(planet_id, format="json", if_none_match=None):
+    return await get_entity_by_id("Planet", planet_id, format, if_none_match)
 
-async def get_species(skip=0, limit=10, search=None, format="json"):
-    return await get_entities("Species", skip, limit, search, format)
+async def get_species(skip=0, limit=10, search=None, format="json", if_none_match=None):
+    return await get_entities("Species", skip, limit, search, format, if_none_match)
 
-async def get_species_by_id(species_id, format="json"):
-    return await get_entity_by_id("Species", species_id, format)
+async def get_species_by_id(species_id, format="json", if_none_match=None):
+    return await get_entity_by_id("Species", species_id, format, if_none_match)
 
-async def get_starships(skip=0, limit=10, search=None, format="json"):
-    return await get_entities("Starship", skip, limit, search, format)
+async def get_starships(skip=0, limit=10, search=None, format="json", if_none_match=None):
+    return await get_entities("Starship", skip, limit, search, format, if_none_match)
 
-async def get_starship_by_id(starship_id, format="json"):
-    return await get_entity_by_id("Starship", starship_id, format)
+async def get_starship_by_id(starship_id, format="json", if_none_match=None):
+    return await get_entity_by_id("Starship", starship_id, format, if_none_match)
 
-async def get_vehicles(skip=0, limit=10, search=None, format="json"):
-    return await get_entities("Vehicle", skip, limit, search, format)
+async def get_vehicles(skip=0, limit=10, search=None, format="json", if_none_match=None):
+    return await get_entities("Vehicle", skip, limit, search, format, if_none_match)
 
-async def get_vehicle_by_id(vehicle_id, format="json"):
-    return await get_entity_by_id("Vehicle", vehicle_id, format)
+async def get_vehicle_by_id(vehicle_id, format="json", if_none_match=None):
+    return await get_entity_by_id("Vehicle", vehicle_id, format, if_none_match)
 
 # HTML generation for entity lists
 def generate_entity_html_response(data, kind, format):
@@ -3,6 +3,7 @@ import json
 from datetime import datetime, timedelta
 from model.model_datastore import model
 from utils.caching import cache_response
+from utils.http_cache import compute_etag, conditional_response
 from utils.html_utils import generate_html_page, generate_download_page
 from fastapi.responses import JSONResponse, HTMLResponse
 from utils.file_utils import save_file
@@ -99,15 +100,13 @@ def generate_weather_data(date: str):
 
     return json.loads(json.dumps(weather_data))
 
-def get_weather_for_date(date: str, format: str = "json"):
+def get_weather_for_date(date: str, format: str = "json", if_none_match=None):
     cache_key = f"weather:{date}:{format}"
     cached_data = cache_response.get(cache_key)
 
     if cached_data:
-        if format == "json":
-            return JSONResponse(content=cached_data)
-        elif format in ["html", "download"]:
-            return generate_weather_html_response(cached_data, date, format)
+        return weather_response(cached_data, format, if_none_match,
+                                lambda: generate_weather_html_response(cached_data, date, format))
 
     existing_data = db.get_weather_data(date)
 
@@ -119,22 +118,18 @@ def get_weather_for_date(date: str, format: str = "json"):
 
     cache_response.set(cache_key, response, expire=3600)
 
-    if format == "json":
-        return JSONResponse(content=response)
-    elif format in ["html", "download"]:
-        return generate_weather_html_response(response, date, format)
+    return weather_response(response, format, if_none_match,
+                            lambda: generate_weather_html_response(response, date, format))
 
-def get_weather_for_month(month: str, format: str = "json"):
+def get_weather_for_month(month: str, format: str = "json", if_none_match=None):
     year, month_number = map(int, month.split("-"))
     days_in_month = (datetime(year, month_number + 1, 1) - timedelta(days=1)).day
     cache_key = f"weather:month:{month}:{format}"
 
     cached_data = cache_response.get(cache_key)
     if cached_data:
-        if format == "json":
-            return JSONResponse(content=cached_data)
-        elif format in ["html", "download"]:
-            return generate_month_html_response(cached_data, month, format)
+        return weather_response(cached_data, format, if_none_match,
+                                lambda: generate_month_html_response(cached_data, month, format))
 
     existing_days = db.get_weather_days_in_month(month)
 
@@ -148,10 +143,18 @@ def get_weather_for_month(month: str, format: str = "json"):
 
     cache_response.set(cache_key, weather_data, expire=3600)
 
+    return weather_response(weather_data, format, if_none_match,
+                            lambda: generate_month_html_response(weather_data, month, format))
+
+def weather_response(data, format, if_none_match, render_html):
+    """JSON or HTML weather response, or 304 if the client's ETag still matches the data."""
     if format == "json":
-        return JSONResponse(content=weather_data)
-    elif format in ["html", "download"]:
-        return generate_month_html_response(weather_data, month, format)
+        return conditional_response(compute_etag(format, data), if_none_match,
+                                    lambda: JSONResponse(content=data))
+    elif format == "html":
+        return conditional_response(compute_etag(format, data), if_none_match, render_html)
+    elif format == "download":
+        return render_html()
 
   
 
@@ -0,0 +1,309 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from utils.bloom_filter import BloomFilter
+
+
+API_KEY_CACHE_TTL = int(os.getenv("API_KEY_CACHE_TTL", 60))  # seconds
+API_KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", 10000))
+NEGATIVE_KEY_CACHE_TTL = int(os.getenv("NEGATIVE_KEY_CACHE_TTL", 30))  # seconds
+NEGATIVE_KEY_CACHE_SIZE = int(os.getenv("NEGATIVE_KEY_CACHE_SIZE", 50000))
+KEY_FILTER_CAPACITY = int(os.getenv("KEY_FILTER_CAPACITY", 100000))
+KEY_FILTER_MIN_REFRESH = int(os.getenv("KEY_FILTER_MIN_REFRESH", 5))  # seconds between catch-up queries
+KEY_FILTER_REBUILD_INTERVAL = int(os.getenv("KEY_FILTER_REBUILD_INTERVAL", 3600))  # seconds
+KEY_FILTER_WATERMARK_MARGIN = int(os.getenv("KEY_FILTER_WATERMARK_MARGIN", 30))  # seconds re-read by each catch-up
+REVOCATION_REFRESH_INTERVAL = int(os.getenv("REVOCATION_REFRESH_INTERVAL", 30))  # seconds
+REVOCATION_RETRY_INTERVAL = int(os.getenv("REVOCATION_RETRY_INTERVAL", 5))  # seconds between failed loads
+
+
+def fingerprint_api_key(api_key):
+    """Hash a raw API key so the raw value is never kept in memory."""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+class VerifiedKeyCache:
+    """Bounded LRU of recently verified API keys.
+
+    Entries are keyed by a hash of the raw key and live until the cache TTL or the
+    key's own ``expires_at``, whichever comes first. Entries can be evicted by key id
+    so that revocation takes effect in this process straight away.
+    """
+
+    def __init__(self, ttl=API_KEY_CACHE_TTL, max_size=API_KEY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # fingerprint -> (expiry, key_id)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, api_key):
+        """Return True if the key was verified recently and has not expired since."""
+        fingerprint = fingerprint_api_key(api_key)
+        with self.lock:
+            item = self.entries.get(fingerprint)
+            if item and time.time() < item[0]:
+                self.entries.move_to_end(fingerprint)
+                self.hits += 1
+                return True
+            if item:
+                del self.entries[fingerprint]
+            self.misses += 1
+            return False
+
+    def set(self, api_key, key_id, expires_at=None):
+        """Remember a verified key until the TTL or its expiry time."""
+        expiry = time.time() + self.ttl
+        if isinstance(expires_at, datetime):
+            expiry = min(expiry, expires_at.timestamp())
+
+        fingerprint = fingerprint_api_key(api_key)
+        with self.lock:
+            self.entries[fingerprint] = (expiry, str(key_id))
+            self.entries.move_to_end(fingerprint)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_key_id(self, key_id):
+        """Drop every cached entry for a key id (used on revocation)."""
+        key_id = str(key_id)
+        with self.lock:
+            stale = [fp for fp, (_, cached_id) in self.entries.items() if cached_id == key_id]
+            for fp in stale:
+                del self.entries[fp]
+        return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Hit/miss counters for monitoring."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class NegativeKeyCache:
+    """Short-lived bounded set of recently rejected API keys (by fingerprint)."""
+
+    def __init__(self, ttl=NEGATIVE_KEY_CACHE_TTL, max_size=NEGATIVE_KEY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # fingerprint -> expiry
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def contains(self, api_key):
+        """Return True if the key was rejected within the last TTL seconds."""
+        fingerprint = fingerprint_api_key(api_key)
+        with self.lock:
+            expiry = self.entries.get(fingerprint)
+            if expiry and time.time() < expiry:
+                self.hits += 1
+                return True
+            if expiry:
+                del self.entries[fingerprint]
+            self.misses += 1
+            return False
+
+    def add(self, api_key):
+        fingerprint = fingerprint_api_key(api_key)
+        with self.lock:
+            self.entries[fingerprint] = time.time() + self.ttl
+            self.entries.move_to_end(fingerprint)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class KeyIdFilter:
+    """Bloom filter of issued API key ids, used to reject unknown ids without an RPC.
+
+    ``loader(created_after)`` returns the key ids created after the given datetime
+    (or all of them when it is None). Keys issued on another instance since the last
+    load are picked up by a catch-up query, issued at most once every
+    KEY_FILTER_MIN_REFRESH seconds no matter how much junk traffic arrives.
+
+    ``created_at`` is set before a key is written, so a key can be committed after
+    a query that started later than its timestamp. Each load therefore moves the
+    watermark only to its start time minus ``watermark_margin``; the overlap is
+    re-read and adding an id twice is harmless.
+    """
+
+    def __init__(self, loader, capacity=KEY_FILTER_CAPACITY,
+                 min_refresh=KEY_FILTER_MIN_REFRESH, rebuild_interval=KEY_FILTER_REBUILD_INTERVAL,
+                 watermark_margin=KEY_FILTER_WATERMARK_MARGIN):
+        self.loader = loader
+        self.capacity = capacity
+        self.min_refresh = min_refresh
+        self.rebuild_interval = rebuild_interval
+        self.watermark_margin = timedelta(seconds=watermark_margin)
+        self.bloom = None
+        self.loaded_until = None  # datetime covered by the last load
+        self.last_refresh = 0.0
+        self.last_rebuild = 0.0
+        self.lock = threading.Lock()
+        self.rejections = 0
+        self.refreshes = 0
+
+    def _rebuild(self):
+        started = datetime.now(timezone.utc)
+        key_ids = list(self.loader(None))
+        bloom = BloomFilter(max(self.capacity, len(key_ids) * 2))
+        for key_id in key_ids:
+            bloom.add(key_id)
+        self.bloom = bloom
+        self.loaded_until = started - self.watermark_margin
+        self.last_refresh = self.last_rebuild = time.time()
+
+    def _catch_up(self):
+        started = datetime.now(timezone.utc)
+        for key_id in self.loader(self.loaded_until):
+            self.bloom.add(key_id)
+        self.loaded_until = started - self.watermark_margin
+        self.last_refresh = time.time()
+        self.refreshes += 1
+
+    def add(self, key_id):
+        """Record a key id issued by this process."""
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(key_id)
+
+    def might_exist(self, key_id):
+        """False means the key id was definitely never issued."""
+        try:
+            if self.bloom is None or time.time() - self.last_rebuild > self.rebuild_interval:
+                with self.lock:
+                    if self.bloom is None or time.time() - self.last_rebuild > self.rebuild_interval:
+                        self._rebuild()
+
+            if key_id in self.bloom:
+                return True
+
+            if time.time() - self.last_refresh >= self.min_refresh:
+                with self.lock:
+                    if time.time() - self.last_refresh >= self.min_refresh:
+                        self._catch_up()
+                if key_id in self.bloom:
+                    return True
+
+        except Exception as e:
+            # Never lock users out because the filter could not be loaded
+            print(f"Error refreshing API key filter: {e}")
+            return True
+
+        self.rejections += 1
+        return False
+
+    def stats(self):
+        return {
+            "loaded": self.bloom is not None,
+            "key_ids": self.bloom.count if self.bloom else 0,
+            "bits": self.bloom.num_bits if self.bloom else 0,
+            "rejections": self.rejections,
+            "catch_up_queries": self.refreshes,
+        }
+
+
+class RevokedKeySet:
+    """In-memory set of revoked key ids, reloaded from Datastore in the background.
+
+    The first lookup loads the set synchronously; after that a stale set triggers
+    a reload on a background thread so request threads never wait on Datastore.
+    ``loader`` only returns keys that have not expired, so each reload also drops
+    the ids of expired keys. Failed loads are retried at most every
+    ``retry_interval`` seconds; until the first one succeeds every key counts as
+    revoked.
+    """
+
+    def __init__(self, loader, refresh_interval=REVOCATION_REFRESH_INTERVAL, retry_interval=REVOCATION_RETRY_INTERVAL):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.revoked = None
+        self.local = {}  # key id -> time revoked by this process
+        self.loaded_at = 0.0
+        self.last_attempt = 0.0
+        self.refreshing = False
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+
+    def _load(self):
+        started = time.time()
+        try:
+            revoked = frozenset(self.loader())
+            with self.lock:
+                # Keep ids revoked locally while the query was running
+                self.local = {key_id: at for key_id, at in self.local.items() if at >= started}
+                self.revoked = revoked | frozenset(self.local)
+                self.loaded_at = time.time()
+        except Exception as e:
+            print(f"Error loading revoked API keys: {e}")
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+    def is_revoked(self, key_id):
+        if self.revoked is None:
+            with self.load_lock:
+                if self.revoked is None and time.time() - self.last_attempt >= self.retry_interval:
+                    self.last_attempt = time.time()
+                    self._load()
+            if self.revoked is None:
+                return True  # Fail closed until the revocation list is known
+        else:
+            with self.lock:
+                now = time.time()
+                start = (now - self.loaded_at > self.refresh_interval and not self.refreshing
+                         and now - self.last_attempt >= self.retry_interval)
+                if start:
+                    self.refreshing = True
+                    self.last_attempt = now
+            if start:
+                threading.Thread(target=self._load, daemon=True).start()
+        return key_id in self.revoked
+
+    def add(self, key_id):
+        """Record a revocation made by this process."""
+        with self.lock:
+            self.local[str(key_id)] = time.time()
+            self.revoked = (self.revoked or frozenset()) | {str(key_id)}
+
+    def stats(self):
+        return {
+            "size": len(self.revoked) if self.revoked is not None else 0,
+            "age_seconds": round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+        }
+
+
+verified_key_cache = VerifiedKeyCache()
+negative_key_cache = NegativeKeyCache()
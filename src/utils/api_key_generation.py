@@ -1,13 +1,38 @@
+import base64
 import secrets
 import hashlib
+import hmac
+import os
 import time
 from datetime import datetime, timedelta, timezone
 from flask import session
 from model.model_datastore import model
+from utils.api_key_cache import verified_key_cache, negative_key_cache, KeyIdFilter, RevokedKeySet
 
 # Initialize Datastore Model
 datastore_model = model()
 
+# Newly issued keys look like "ak_<lookup id>.<secret>". The lookup id is public and
+# is the Datastore key name, so validation is a single keyed get plus one hash.
+KEY_ID_PREFIX = "ak_"
+KEY_ID_SEPARATOR = "."
+
+# Keys issued before lookup ids existed can only be found by scanning every active key.
+# They expire after 30 days; once they are gone set ALLOW_LEGACY_API_KEYS=false.
+ALLOW_LEGACY_API_KEYS = os.getenv("ALLOW_LEGACY_API_KEYS", "true").lower() == "true"
+
+# Bloom filter of issued key ids so unknown ids are rejected without a Datastore get
+key_id_filter = KeyIdFilter(datastore_model.get_api_key_ids)
+
+# Optional self-validating keys: "sk_<id>.<expiry>.<signature>", HMAC-SHA256 signed with
+# API_KEY_SIGNING_SECRET. They are checked in CPU plus an in-memory revocation set.
+# Set API_KEY_FORMAT=signed (with a secret) to issue them from the dashboard.
+SIGNED_KEY_PREFIX = "sk_"
+API_KEY_SIGNING_SECRET = os.getenv("API_KEY_SIGNING_SECRET", "")
+API_KEY_FORMAT = os.getenv("API_KEY_FORMAT", "prefixed")
+
+revoked_key_set = RevokedKeySet(datastore_model.get_revoked_api_key_ids)
+
 def generate_salt():
     """Generate a unique salt value."""
     return secrets.token_hex(16)  # 32-character salt (16 bytes)
@@ -16,6 +41,48 @@ def generate_api_key():
     """Generate a secure 64-byte random API key."""
     return secrets.token_urlsafe(64)  # 64-byte key
 
+def generate_key_id():
+    """Generate the public lookup id that prefixes a new API key."""
+    return f"{KEY_ID_PREFIX}{secrets.token_hex(8)}"
+
+def split_api_key(api_key):
+    """Split a presented key into (key_id, secret); key_id is None for legacy keys."""
+    if api_key.startswith(KEY_ID_PREFIX) and KEY_ID_SEPARATOR in api_key:
+        key_id, secret = api_key.split(KEY_ID_SEPARATOR, 1)
+        if secret:
+            return key_id, secret
+    return None, api_key
+
+def sign_key_payload(payload):
+    """HMAC-SHA256 signature of a signed-key payload, base64url without padding."""
+    digest = hmac.new(API_KEY_SIGNING_SECRET.encode(), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+def generate_signed_api_key(expiration_date):
+    """Build a signed key embedding its id and expiry. Returns (key_id, raw_api_key)."""
+    key_id = f"{SIGNED_KEY_PREFIX}{secrets.token_hex(8)}"
+    payload = f"{key_id}{KEY_ID_SEPARATOR}{int(expiration_date.timestamp())}"
+    return key_id, f"{payload}{KEY_ID_SEPARATOR}{sign_key_payload(payload)}"
+
+def verify_signed_api_key(api_key):
+    """Check signature, expiry and revocation of a signed key without Datastore."""
+    if not API_KEY_SIGNING_SECRET:
+        return False
+
+    parts = api_key.split(KEY_ID_SEPARATOR)
+    if len(parts) != 3 or not parts[1].isdigit():
+        return False
+
+    key_id, expires_at, signature = parts
+    payload = f"{key_id}{KEY_ID_SEPARATOR}{expires_at}"
+    if not hmac.compare_digest(sign_key_payload(payload), signature):
+        return False
+
+    if int(expires_at) <= time.time():
+        return False
+
+    return not revoked_key_set.is_revoked(key_id)
+
 def hash_api_key(api_key, salt):
     """Hash the API key with a unique salt using SHA-256."""
     combined = f"{api_key}{salt}"  # Append salt to key
@@ -25,18 +92,24 @@ def store_api_key(user_email, session):
     """Generate and store a unique API key using a salted hash."""
     try:
         # Generate new API key components
-        raw_api_key = generate_api_key()
+        expiration_date = datetime.now(timezone.utc) + timedelta(days=30)
+        if API_KEY_FORMAT == "signed" and API_KEY_SIGNING_SECRET:
+            key_id, raw_api_key = generate_signed_api_key(expiration_date)
+        else:
+            key_id = generate_key_id()
+            raw_api_key = f"{key_id}{KEY_ID_SEPARATOR}{generate_api_key()}"
         salt = generate_salt()
         hashed_api_key = hash_api_key(raw_api_key, salt)
-        expiration_date = datetime.now(timezone.utc) + timedelta(days=30)
 
-        # Store API key in Datastore
+        # Store API key in Datastore under its lookup id
         datastore_model.store_api_key(
             user_email=user_email,
             salt=salt,
             hashed_api_key=hashed_api_key,
-            expiration_date=expiration_date
+            expiration_date=expiration_date,
+            key_id=key_id
         )
+        key_id_filter.add(key_id)
 
         # Store raw API key temporarily in session
         session['temp_api_key'] = {
@@ -57,7 +130,7 @@ def get_user_api_keys(user_email):
         # Filter and format API keys
         current_time = datetime.now(timezone.utc)
         return [{
-            'api_key_id': key.id,
+            'api_key_id': key.key.id_or_name,
             'masked_key': '************' + key['hashed_api_key'][-4:],  # Show last 4 chars
             'expires_at': key['expires_at']
         } for key in api_keys 
@@ -68,28 +141,68 @@ def get_user_api_keys(user_email):
         print(f"Error fetching API keys: {e}")
         return []
 
+def is_active_api_key_entry(entry, current_time=None):
+    """Check that a stored key entity is neither revoked nor expired."""
+    current_time = current_time or datetime.now(timezone.utc)
+    return bool(entry) and not entry.get('revoked', False) and entry['expires_at'] > current_time
+
+def matches_api_key_entry(api_key, entry):
+    """Compare a presented key against a stored salted hash in constant time."""
+    test_hash = hash_api_key(api_key, entry['salt'])
+    return hmac.compare_digest(test_hash, entry['hashed_api_key'])
+
+def find_api_key_entry(api_key):
+    """Return the active stored entity matching the presented key, or None."""
+    key_id, _ = split_api_key(api_key)
+    current_time = datetime.now(timezone.utc)
+
+    if key_id:
+        # Prefixed key: one keyed get, one hash compare
+        entry = datastore_model.get_api_key(key_id)
+        if is_active_api_key_entry(entry, current_time) and matches_api_key_entry(api_key, entry):
+            return entry
+        return None
+
+    if not ALLOW_LEGACY_API_KEYS:
+        return None
+
+    # Legacy key: scan every active key and re-hash against each salt
+    for entry in datastore_model.get_all_active_api_keys():
+        if entry['expires_at'] <= current_time:
+            continue
+        if matches_api_key_entry(api_key, entry):
+            return entry
+
+    return None
+
 def validate_api_key(api_key):
     """Validate an API key by checking its existence, expiration, and revocation status."""
     try:
-        # Get all active API keys
-        api_keys = datastore_model.get_all_active_api_keys() 
-        current_time = datetime.now(timezone.utc)
+        # Signed keys never need Datastore on the request path
+        if api_key.startswith(SIGNED_KEY_PREFIX):
+            return verify_signed_api_key(api_key)
 
-        # Check each key
-        for entry in api_keys:
-            # Skip if expired
-            if entry['expires_at'] <= current_time:
-                continue
+        if verified_key_cache.get(api_key):
+            return True
 
-            # Compare hashed values
-            salt = entry['salt']
-            stored_hash = entry['hashed_api_key']
-            test_hash = hash_api_key(api_key, salt)
+        # Keys rejected a moment ago are rejected again without touching Datastore
+        if negative_key_cache.contains(api_key):
+            return False
 
-            if test_hash == stored_hash:
-                return True
+        # Unknown key ids are rejected by the Bloom filter without any RPC or hashing.
+        # Not negatively cached: the id may have been issued on another instance since
+        # the last catch-up, and the next one will add it.
+        key_id, _ = split_api_key(api_key)
+        if key_id and not key_id_filter.might_exist(key_id):
+            return False
 
-        return False
+        entry = find_api_key_entry(api_key)
+        if entry is None:
+            negative_key_cache.add(api_key)
+            return False
+
+        verified_key_cache.set(api_key, entry.key.id_or_name, entry['expires_at'])
+        return True
 
     except Exception as e:
         print(f"Error validating API key: {e}")
@@ -100,6 +213,8 @@ def revoke_api_key(user_email, api_key_id):
     try:
         success = datastore_model.revoke_api_key(user_email, api_key_id)
         if success:
+            verified_key_cache.invalidate_key_id(api_key_id)
+            revoked_key_set.add(api_key_id)
             print(f" API Key {api_key_id} revoked successfully")
         else:
             print(f"Failed to revoke API Key {api_key_id}")
@@ -0,0 +1,192 @@
+import asyncio
+import io
+from urllib.parse import unquote, urlsplit
+
+from requests.adapters import BaseAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3 import HTTPResponse
+
+ASGI_STREAM_BUFFER = 16  # Body messages queued ahead of a slow reader before the app is paused
+
+
+class ASGIAdapter(BaseAdapter):
+    """requests transport adapter that dispatches to an ASGI app in the same process.
+
+    Mounted on the FastAPI base URL, it lets gateway code keep using ``http_client``
+    while requests skip the socket and the HTTP serialize/parse round trip. The app
+    runs on ``loop`` (the server's event loop); the calling thread blocks on the
+    result, so the adapter must be used from worker threads, never from the loop.
+
+    ``send`` returns once the app has started its response; the body is read from
+    the app as it is produced (see ASGIBodyStream), so streamed responses are
+    relayed chunk by chunk rather than buffered.
+    """
+
+    def __init__(self, app, loop):
+        super().__init__()
+        self.app = app
+        self.loop = loop
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        url = urlsplit(request.url)
+        body = request.body or b""
+        if isinstance(body, str):
+            body = body.encode()
+
+        headers = [(name.lower().encode("latin-1"), str(value).encode("latin-1"))
+                   for name, value in request.headers.items()]
+        if not any(name == b"host" for name, _ in headers):
+            headers.append((b"host", url.netloc.encode("latin-1")))
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": request.method,
+            "scheme": url.scheme,
+            "path": unquote(url.path) or "/",
+            "raw_path": (url.path or "/").encode("latin-1"),
+            "query_string": url.query.encode("latin-1"),
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 0),
+            "server": (url.hostname, url.port or 80),
+        }
+
+        if isinstance(timeout, tuple):
+            timeout = timeout[1]
+
+        future = asyncio.run_coroutine_threadsafe(self._start(scope, body), self.loop)
+        try:
+            status, response_headers, queue, task = future.result(timeout)
+        except Exception as e:
+            future.cancel()
+            raise RequestsConnectionError(e, request=request)
+
+        body_stream = ASGIBodyStream(self.loop, queue, task, timeout)
+        return self.build_response(request, status, response_headers, body_stream)
+
+    async def _start(self, scope, body):
+        """Run the app in a task; returns (status, headers, body queue, task) once the response starts."""
+        received = False
+        ended = False
+        started = asyncio.get_running_loop().create_future()
+        queue = asyncio.Queue(ASGI_STREAM_BUFFER)  # bytes chunks, then None, or an exception
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # The request body has been consumed; wait until the app stops listening
+            await asyncio.Event().wait()
+
+        async def send(message):
+            nonlocal ended
+            if message["type"] == "http.response.start":
+                started.set_result((message["status"], message.get("headers", [])))
+            elif message["type"] == "http.response.body" and not ended:
+                if message.get("body"):
+                    await queue.put(message["body"])
+                if not message.get("more_body", False):
+                    ended = True
+                    await queue.put(None)
+
+        async def run():
+            nonlocal ended
+            try:
+                await self.app(scope, receive, send)
+            except Exception as e:
+                if not started.done():
+                    started.set_exception(e)
+                elif not ended:
+                    ended = True
+                    await queue.put(e)
+                return
+            if not started.done():
+                started.set_result((500, []))  # The app returned without responding
+            if not ended:
+                ended = True
+                await queue.put(None)
+
+        task = asyncio.ensure_future(run())
+        try:
+            status, response_headers = await started
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        return status, response_headers, queue, task
+
+    def build_response(self, request, status, headers, body_stream):
+        decoded = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in headers]
+        raw = HTTPResponse(
+            body=body_stream,
+            headers=decoded,
+            status=status,
+            preload_content=False,
+            decode_content=False,
+        )
+
+        response = Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(raw.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = raw
+        response.reason = raw.reason
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+class ASGIBodyStream(io.RawIOBase):
+    """Read-only file object over the body of an ASGI response that is still running.
+
+    Chunks come from a bounded queue on the app's loop, so the app is paused while
+    the reader falls ASGI_STREAM_BUFFER messages behind. Closing the stream before
+    the end cancels the app.
+    """
+
+    def __init__(self, loop, queue, task, timeout=None):
+        super().__init__()
+        self.loop = loop
+        self.queue = queue
+        self.task = task
+        self.timeout = timeout
+        self.pending = b""
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending and not self.finished:
+            future = asyncio.run_coroutine_threadsafe(self.queue.get(), self.loop)
+            try:
+                chunk = future.result(self.timeout)
+            except Exception:
+                future.cancel()
+                self.close()
+                raise
+            if chunk is None:
+                self.finished = True
+            elif isinstance(chunk, Exception):
+                self.finished = True
+                raise OSError(f"ASGI app failed while streaming: {chunk}") from chunk
+            else:
+                self.pending = chunk
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed and not self.task.done() and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.task.cancel)  # Reader went away before the end
+        super().close()
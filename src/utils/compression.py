@@ -0,0 +1,342 @@
+"""
+Negotiated gzip/brotli compression for both tiers.
+
+- CompressionMiddleware (ASGI) compresses FastAPI's JSON and HTML responses,
+  including streamed ones, once they pass COMPRESSION_MIN_SIZE.
+- compress_flask_response is the gateway's after_request hook for responses Flask
+  renders itself (pages, cached API responses). Streamed pass-through responses
+  already carry FastAPI's encoding and are left alone.
+- Static assets are compressed ahead of time by precompress_static (at image build
+  and at startup) and served from their .br/.gz siblings, never per request.
+
+Brotli is used when the ``brotli`` package is installed; otherwise gzip only.
+
+    python -m utils.compression static
+"""
+import gzip
+import mimetypes
+import os
+import sys
+import tempfile
+import threading
+import zlib
+
+import flask
+from werkzeug.security import safe_join
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))  # bytes
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))  # per-request; static files use 11
+
+# Encodings in server preference order, with the file suffix of precompressed copies
+ENCODINGS = (("br", ".br"), ("gzip", ".gz")) if brotli else (("gzip", ".gz"),)
+SUFFIXES = dict(ENCODINGS)
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/javascript", "application/xml",
+    "application/manifest+json", "image/svg+xml",
+)
+PRECOMPRESS_EXTENSIONS = (".js", ".css", ".html", ".svg", ".json", ".txt", ".map")
+PRECOMPRESS_SKIP_DIRS = ("downloads", "templates")  # runtime files and Jinja sources
+
+
+class CompressionStats:
+    """Bytes before and after compression, per endpoint."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, original_size, sent_size):
+        with self.lock:
+            counters = self.endpoints.setdefault(endpoint, [0, 0, 0])
+            counters[0] += 1
+            counters[1] += original_size
+            counters[2] += sent_size
+
+    def stats(self):
+        with self.lock:
+            return {
+                endpoint: {
+                    "responses": responses,
+                    "bytes_original": original,
+                    "bytes_sent": sent,
+                    "bytes_saved": original - sent,
+                    "ratio": round(sent / original, 3) if original else None,
+                }
+                for endpoint, (responses, original, sent) in sorted(self.endpoints.items())
+            }
+
+
+compression_stats = CompressionStats()
+
+
+def choose_encoding(accept_encoding, available=None):
+    """Best encoding in ``available`` that the Accept-Encoding header allows, or None."""
+    if not accept_encoding:
+        return None
+    available = [name for name, _ in ENCODINGS] if available is None else available
+
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for name in available:  # Ties go to the server's preference order
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def is_compressible(content_type):
+    content_type = (content_type or "").lower()
+    return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+
+def compress(data, encoding, quality=None):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY if quality is None else quality)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL if quality is None else quality, mtime=0)
+
+
+def compressor(encoding):
+    """Incremental compressor for streamed bodies: returns (process, flush) callables."""
+    if encoding == "br":
+        stream = brotli.Compressor(quality=BROTLI_QUALITY)
+        return stream.process, stream.finish
+    stream = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    return stream.compress, stream.flush
+
+
+def weak_etag(etag):
+    """An encoded body is not byte-identical to the original, so its ETag becomes weak."""
+    if etag and not etag.startswith("W/"):
+        return "W/" + etag
+    return etag
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing large text responses for clients that accept it."""
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE, stats=compression_stats):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        state = {"mode": None, "original": 0, "sent": 0}
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message  # Held until the first body chunk shows the size
+                return
+            if message["type"] != "http.response.body" or state["mode"] == "identity":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if state["mode"] is None:
+                headers = MutableHeaders(raw=list(start["headers"]))
+                length = headers.get("content-length")
+                size = int(length) if length and length.isdigit() else len(body)
+                unknown_length = more_body and not length  # Streamed; size only known at the end
+                if (start["status"] != 200 or "content-encoding" in headers
+                        or not is_compressible(headers.get("content-type"))
+                        or (size < self.minimum_size and not unknown_length)):
+                    state["mode"] = "identity"
+                    await send(start)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "etag" in headers:
+                    headers["ETag"] = weak_etag(headers["etag"])
+                del headers["content-length"]
+
+                if not more_body:  # Whole body in one message: compress it in one go
+                    compressed = compress(body, encoding)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send({**start, "headers": headers.raw})
+                    await send({"type": "http.response.body", "body": compressed})
+                    self.stats.record(endpoint_name(scope), len(body), len(compressed))
+                    return
+
+                state["mode"] = "stream"
+                state["process"], state["flush"] = compressor(encoding)
+                await send({**start, "headers": headers.raw})
+
+            chunk = state["process"](body)
+            if not more_body:
+                chunk += state["flush"]()
+            state["original"] += len(body)
+            state["sent"] += len(chunk)
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            if not more_body:
+                self.stats.record(endpoint_name(scope), state["original"], state["sent"])
+
+        await self.app(scope, receive, send_compressed)
+
+
+def endpoint_name(scope):
+    """Route function name set by the router, else the request path."""
+    return getattr(scope.get("endpoint"), "__name__", None) or scope["path"]
+
+
+def compress_flask_response(response, accept_encoding, endpoint, minimum_size=COMPRESSION_MIN_SIZE):
+    """Compress a buffered Flask response in place when the client accepts it."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or "Content-Encoding" in response.headers or not is_compressible(response.mimetype)):
+        return response
+
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < minimum_size:
+        return response
+
+    compressed = compress(body, encoding)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    if "ETag" in response.headers:
+        response.headers["ETag"] = weak_etag(response.headers["ETag"])
+    compression_stats.record(endpoint or "unknown", len(body), len(compressed))
+    return response
+
+
+def precompressed_encodings(path):
+    """Encodings with an up-to-date precompressed sibling of ``path``."""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return []
+    available = []
+    for name, suffix in ENCODINGS:
+        try:
+            if os.stat(path + suffix).st_mtime >= mtime:
+                available.append(name)
+        except OSError:
+            pass
+    return available
+
+
+def precompress_file(path, encoding):
+    """Write ``path`` + suffix at maximum compression, atomically. False if not worth it."""
+    with open(path, "rb") as f:
+        data = f.read()
+    compressed = compress(data, encoding, quality=11 if encoding == "br" else 9)
+    if len(compressed) >= len(data):
+        return False
+
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".precompress-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path + SUFFIXES[encoding])
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+def precompress_static(directory, minimum_size=COMPRESSION_MIN_SIZE):
+    """Create missing or stale .br/.gz copies of the text assets under ``directory``."""
+    written = 0
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d not in PRECOMPRESS_SKIP_DIRS]
+        for filename in files:
+            if not filename.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(root, filename)
+            if os.path.getsize(path) < minimum_size:
+                continue
+            fresh = precompressed_encodings(path)
+            for encoding, _ in ENCODINGS:
+                if encoding not in fresh and precompress_file(path, encoding):
+                    written += 1
+    if written:
+        print(f"Precompressed {written} static file(s) in {directory}")
+    return written
+
+
+def send_precompressed(directory, filename, accept_encoding):
+    """Flask static view serving the .br/.gz sibling of ``filename`` when one is acceptable."""
+    path = safe_join(directory, filename)
+    encoding = choose_encoding(accept_encoding, precompressed_encodings(path)) if path else None
+    if encoding is None:
+        return flask.send_from_directory(directory, filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    # Named after the requested file, so only Content-Encoding tells the representations apart
+    response = flask.send_from_directory(directory, filename + SUFFIXES[encoding], mimetype=mimetype,
+                                         download_name=os.path.basename(filename))
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    if response.status_code == 200:
+        compression_stats.record("static", os.path.getsize(path), os.path.getsize(path + SUFFIXES[encoding]))
+    return response
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves an acceptable .br/.gz sibling instead of the original."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding"), precompressed_encodings(full_path))
+        if encoding is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        sibling = f"{full_path}{SUFFIXES[encoding]}"
+        sibling_stat = os.stat(sibling)
+        response = FileResponse(
+            sibling,
+            status_code=status_code,
+            stat_result=sibling_stat,
+            media_type=mimetypes.guess_type(str(full_path))[0] or "application/octet-stream",
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        compression_stats.record("static", stat_result.st_size, sibling_stat.st_size)
+        return response
+
+
+if __name__ == "__main__":
+    for target in sys.argv[1:] or ["static"]:
+        precompress_static(target)
@@ -29,6 +29,12 @@ def save_file(content: str, file_extension: str, folder: str):
 
     return file_path
 
+# Read a whole file as bytes
+def read_file(file_path: str) -> bytes:
+    """Returns the contents of a (small) file."""
+    with open(file_path, "rb") as file:
+        return file.read()
+
 # Serve any file with the correct MIME type
 def get_downloadable_file_response(file_path: str):
     """Returns a FastAPI FileResponse with the correct MIME type based on file extension."""
@@ -21,21 +21,39 @@ def get_category_directories():
     
     return category_dirs
 
-def validate_api_key_request(apikey):
-    """Validates if an API key is provided and checks its validity."""
+def api_key_error(apikey):
+    """Returns (error payload, status) if the API key is missing or invalid, else None.
+
+    Framework-neutral so the Flask gateway and the async gateway share the same rules.
+    """
     from utils.api_key_generation import validate_api_key, is_test_api_key
     if not apikey:
-        return flask.jsonify({"error": "Missing API key"}), 400
+        return {"error": "Missing API key"}, 400
     
     # Allow the special test key
     if is_test_api_key(apikey):
         return None
     
     if not validate_api_key(apikey):
-        return flask.jsonify({"error": "Unauthorized. Invalid API key"}), 401
+        return {"error": "Unauthorized. Invalid API key"}, 401
+    
+    return None
+
+def validate_api_key_request(apikey):
+    """Validates if an API key is provided and checks its validity."""
+    error = api_key_error(apikey)
+    if error:
+        payload, status = error
+        return flask.jsonify(payload), status
     
     return None
 
+def load_gateway_app():
+    """Load app.py (shadowed by the app/ package on import) and return its globals."""
+    import runpy
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return runpy.run_path(os.path.join(src_dir, "app.py"), run_name="gateway")
+
 def cleanup_old_files(folder: str, file_extension: str, age_limit: int = 3600):
     """
     Deletes files older than the specified `age_limit` (in seconds).
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+from starlette.responses import Response
+
+
+# Seconds a successful GET may be reused by clients and the gateway, by path prefix.
+# Mirrors the 1 hour service-side cache; course data can be regenerated, so it is short.
+CACHE_CONTROL_TTLS = (
+    ("/starwars/", int(os.getenv("STARWARS_CACHE_TTL", 3600))),
+    ("/weather/", int(os.getenv("WEATHER_CACHE_TTL", 3600))),
+    ("/api/header/", int(os.getenv("GRADEBOOK_CACHE_TTL", 60))),
+    ("/api/gradebook/", int(os.getenv("GRADEBOOK_CACHE_TTL", 60))),
+    ("/images/", int(os.getenv("PREVIEWS_CACHE_TTL", 3600))),
+)
+
+
+def parse_cache_control(value):
+    """Parse a Cache-Control header into {directive: value or True}."""
+    directives = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') if arg else True
+    return directives
+
+
+def shared_max_age(value):
+    """Seconds a shared cache may keep a response, or 0 if it must not be stored."""
+    directives = parse_cache_control(value)
+    if any(d in directives for d in ("no-store", "private", "no-cache")):
+        return 0
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                return max(0, int(directives[name]))
+            except (TypeError, ValueError):
+                return 0
+    return 0
+
+
+def cache_control_for(method, path, query_string):
+    """Cache-Control value for a successful response, or None to leave it unset."""
+    if method != "GET":
+        return None
+    if b"format=download" in query_string or b"format=paragraph_download" in query_string:
+        return "no-store"  # Each download page links to a freshly written file
+    for prefix, ttl in CACHE_CONTROL_TTLS:
+        if path.startswith(prefix):
+            return f"public, max-age={ttl}"
+    return None
+
+
+class CacheControlMiddleware:
+    """ASGI middleware adding Cache-Control to idempotent data endpoints."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        value = cache_control_for(scope["method"], scope["path"], scope.get("query_string", b""))
+        if value is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cache_control(message):
+            if message["type"] == "http.response.start" and message["status"] in (200, 304):
+                headers = list(message.get("headers", []))
+                if not any(name.lower() == b"cache-control" for name, _ in headers):
+                    headers.append((b"cache-control", value.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_control)
+
+
+def compute_etag(*parts):
+    """Strong ETag derived from the content (or version) parts that determine a response."""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return '"' + hashlib.sha256(payload.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(etag, if_none_match):
+    """True if an If-None-Match header value matches ``etag``."""
+    if not etag or not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in candidates or etag in [tag[2:] for tag in candidates if tag.startswith("W/")]
+
+
+def not_modified(etag):
+    """Empty 304 response carrying the validator of the resource."""
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def conditional_response(etag, if_none_match, render):
+    """Return 304 if the client already has ``etag``, else ``render()`` tagged with it.
+
+    ``render`` is only called on a mismatch, so matching requests skip building the body.
+    """
+    if etag_matches(etag, if_none_match):
+        return not_modified(etag)
+    response = render()
+    if response is not None:
+        response.headers["ETag"] = etag
+    return response
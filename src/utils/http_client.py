@@ -0,0 +1,110 @@
+import os
+import threading
+import flask
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Gateway -> FastAPI connection settings
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", 50))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 3.05))  # seconds
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", 120))  # LLM paragraphs can be slow
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", 2))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Upstream headers worth passing back to the client on streamed responses
+PASSTHROUGH_HEADERS = (
+    "Content-Type", "Content-Length", "Content-Disposition",
+    "ETag", "Last-Modified", "Cache-Control", "Expires", "Vary", "Retry-After",
+)
+
+
+def create_adapter(pool_size=UPSTREAM_POOL_SIZE, retries=UPSTREAM_RETRIES):
+    """Keep-alive connection pool shared by every gateway thread.
+
+    Only idempotent requests are retried, and only when the connection could not be
+    made or the upstream answered 502/504. Read timeouts are never retried.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        status_forcelist=(502, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        backoff_factor=0.1,
+        raise_on_status=False,
+    )
+    return HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry, pool_block=False)
+
+
+adapter = create_adapter()
+_mounts = {"http://": adapter, "https://": adapter}
+_local = threading.local()
+
+
+def mount(prefix, transport):
+    """Route requests whose URL starts with ``prefix`` through another adapter.
+
+    Used by the co-hosted mode to dispatch FastAPI calls in-process. Must be called
+    before the gateway starts serving requests.
+    """
+    _mounts[prefix] = transport
+
+
+def get_session():
+    """Per-thread Session mounted on the shared adapter.
+
+    Sessions keep per-thread state such as cookies, while the adapter (and so the
+    pool of open connections to FastAPI) is shared by all threads.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        # Buffered calls are decoded here anyway; streamed calls pass the client's header
+        session.headers["Accept-Encoding"] = "identity"
+        for prefix, transport in _mounts.items():
+            session.mount(prefix, transport)
+        _local.session = session
+    return session
+
+
+def request(method, url, **kwargs):
+    """Send a request to the upstream service through the pooled session."""
+    kwargs.setdefault("timeout", (UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT))
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def stream_response(response, headers=PASSTHROUGH_HEADERS):
+    """Relay an upstream ``stream=True`` response to the client chunk by chunk.
+
+    The body is never held in memory as a whole, and the upstream connection is
+    returned to the pool once the last chunk has been sent.
+    """
+    def generate():
+        try:
+            for chunk in response.raw.stream(STREAM_CHUNK_SIZE, decode_content=False):
+                yield chunk
+        finally:
+            response.close()
+
+    passthrough = {name: response.headers[name] for name in headers if name in response.headers}
+    # Bodies are relayed undecoded, so the encoding has to travel with them
+    if "Content-Encoding" in response.headers:
+        passthrough["Content-Encoding"] = response.headers["Content-Encoding"]
+
+    return flask.Response(
+        flask.stream_with_context(generate()),
+        status=response.status_code,
+        headers=passthrough,
+        direct_passthrough=True
+    )
@@ -0,0 +1,93 @@
+"""
+Packaging for the batch image endpoint: many resized variants in one streamed
+response, either as a zip archive or as a multipart/mixed body.
+
+Parts are written in the order the variants finish, not the order they were
+requested, so every part carries the index of its spec: in the file name, and
+for multipart also as Content-ID. Variants that could not be produced are
+reported in manifest.json (zip) or as an application/json part (multipart).
+
+``variants`` is an async iterator of BatchVariant, as produced by the endpoint.
+"""
+import json
+import os
+import re
+import time
+import uuid
+import zipfile
+from collections import namedtuple
+
+from utils.resize_pool import RESIZE_WORKERS
+
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", 100))
+# Variants resized at the same time for one batch; the rest of the pool stays free for other requests
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", max(RESIZE_WORKERS, 1) * 2))
+BATCH_PACKAGING = ("zip", "multipart")
+
+# error is None, or {"status": ..., "error": ...} when the variant could not be produced
+BatchVariant = namedtuple("BatchVariant", "index filename media_type body etag error")
+
+
+def variant_filename(index, category, name, width, height, extension):
+    """Archive-safe file name; category and name come from the client."""
+    label = re.sub(r"[^A-Za-z0-9_-]", "_", f"{category}-{name}")
+    return f"{index:03d}-{label}-{width}x{height}{extension}"
+
+
+class ChunkBuffer:
+    """Write-only, unseekable file object for zipfile; ``drain`` hands back what was written."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+async def zip_stream(variants):
+    """Zip archive of the variants plus manifest.json.
+
+    Images are already compressed, so entries are stored as-is. The archive is
+    written with data descriptors, so each entry is sent as soon as it is added.
+    """
+    buffer = ChunkBuffer()
+    manifest = []
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        async for variant in variants:
+            if variant.error:
+                manifest.append({"index": variant.index, **variant.error})
+                continue
+            archive.writestr(zipfile.ZipInfo(variant.filename, time.localtime()[:6]), variant.body)
+            manifest.append({"index": variant.index, "status": 200, "file": variant.filename, "etag": variant.etag})
+            yield buffer.drain()
+        manifest.sort(key=lambda entry: entry["index"])
+        archive.writestr(zipfile.ZipInfo("manifest.json", time.localtime()[:6]), json.dumps(manifest, indent=2))
+    yield buffer.drain()
+
+
+def multipart_boundary():
+    return f"batch-{uuid.uuid4().hex}"
+
+
+async def multipart_stream(variants, boundary):
+    """multipart/mixed body with one part per variant."""
+    async for variant in variants:
+        if variant.error:
+            body = json.dumps({"index": variant.index, **variant.error}).encode()
+            headers = "Content-Type: application/json\r\n"
+        else:
+            body = variant.body
+            headers = (f"Content-Type: {variant.media_type}\r\n"
+                       f'Content-Disposition: attachment; filename="{variant.filename}"\r\n'
+                       f"ETag: {variant.etag}\r\n")
+        head = f"--{boundary}\r\n{headers}Content-ID: <{variant.index}>\r\nContent-Length: {len(body)}\r\n\r\n"
+        yield head.encode() + body + b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
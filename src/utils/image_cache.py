@@ -0,0 +1,246 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # No cross-process locking on Windows: every process owns its cache
+    fcntl = None
+
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "cache/")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+IMAGE_MEMORY_CACHE_BYTES = int(os.getenv("IMAGE_MEMORY_CACHE_BYTES", 64 * 1024 * 1024))
+IMAGE_MEMORY_MAX_ENTRY_BYTES = int(os.getenv("IMAGE_MEMORY_MAX_ENTRY_BYTES", 512 * 1024))
+IMAGE_CACHE_SCAN_INTERVAL = float(os.getenv("IMAGE_CACHE_SCAN_INTERVAL", 300))  # seconds between owner rescans
+STALE_TEMP_SECONDS = 3600  # Temp files older than this were left by a crashed writer
+
+
+class DiskImageCache:
+    """Persistent, content-addressed cache of resized images with LRU eviction.
+
+    Files are named by a hash of the source image's bytes and the output settings
+    plus the format's extension (see image_processing.resize_key), fanned out over
+    256 subdirectories. The index of files and their sizes is rebuilt by ``scan``
+    at startup, ordered by last access time, so the cache survives restarts and
+    deploys. When the total size passes ``max_bytes`` the least recently used
+    files are deleted.
+
+    Files written by other processes are adopted into the index the first time
+    they are looked up.
+
+    Several uvicorn workers can share one directory. Files are only ever
+    published whole (written to a temp file, then renamed), and only the worker
+    holding the owner lock deletes anything: legacy and stale temp files, and
+    LRU eviction. The owner rescans every IMAGE_CACHE_SCAN_INTERVAL to see what
+    its peers wrote; hits in any worker refresh the file's mtime so the rescan
+    orders them correctly. If the owner exits, another worker takes over.
+    """
+
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> file size, least recently used first
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.owner = fcntl is None
+        self.owner_lock = None
+
+    def claim_ownership(self):
+        """Become the process that cleans up and evicts, unless another one already is."""
+        if self.owner:
+            return True
+        lock_dir = os.path.join(self.directory, ".locks")
+        os.makedirs(lock_dir, exist_ok=True)
+        lock_file = open(os.path.join(lock_dir, "owner.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.owner_lock = lock_file  # Held (open) for the life of the process
+        self.owner = True
+        print(f"Image cache: process {os.getpid()} owns cleanup of {self.directory}")
+        return True
+
+    def maintain(self):
+        """Periodic job for every worker: take over ownership if free, and rescan if owner."""
+        if self.claim_ownership():
+            self.scan()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def scan(self):
+        """Rebuild the index from the files on disk; the owner also drops leftover and temp files."""
+        found = []
+        now = time.time()
+        top = os.path.normpath(self.directory)
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if os.path.normpath(root) == top:
+                    if self.owner:
+                        remove(path)  # Named by the old {w}x{h}_{basename} scheme; never looked up
+                elif filename.endswith(".tmp"):
+                    if self.owner and now - stat.st_mtime > STALE_TEMP_SECONDS:
+                        remove(path)  # Left by a writer that crashed; live writers rename within seconds
+                else:
+                    found.append((max(stat.st_atime, stat.st_mtime), filename, stat.st_size))
+
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            for _, key, size in sorted(found):
+                self.entries[key] = size
+                self.bytes += size
+        print(f"Image cache: {len(found)} files, {self.bytes} bytes in {self.directory}")
+        self.evict()
+
+    def get(self, key):
+        """Path of the cached file for ``key``, or None on a miss."""
+        path = self.path_for(key)
+        with self.lock:
+            hit = key in self.entries
+            if hit:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if hit:
+            try:
+                os.utime(path)  # Recency for the owner's next rescan
+                return path
+            except FileNotFoundError:  # Evicted by the owner
+                with self.lock:
+                    self.bytes -= self.entries.pop(key, 0)
+                    self.hits -= 1
+        try:
+            size = os.path.getsize(path)  # Written by another process since the scan
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None
+        self.add(key, size, hit=True)
+        return path
+
+    def contains(self, key):
+        """True if ``key`` is cached here or on disk; unlike ``get`` it neither counts nor refreshes recency."""
+        with self.lock:
+            if key in self.entries:
+                return True
+        return os.path.exists(self.path_for(key))
+
+    def add(self, key, size, hit=False):
+        """Record a file that has just been written (or found) for ``key``."""
+        with self.lock:
+            if hit:
+                self.hits += 1
+            self.bytes += size - self.entries.pop(key, 0)
+            self.entries[key] = size
+        self.evict()
+
+    def evict(self):
+        if not self.owner:
+            return  # Peers index the same files; only the owner deletes
+        while True:
+            with self.lock:
+                if self.bytes <= self.max_bytes or not self.entries:
+                    return
+                key, size = self.entries.popitem(last=False)
+                self.bytes -= size
+                self.evictions += 1
+            remove(self.path_for(key))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "owner": self.owner,
+            }
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:  # Already removed by another process
+        pass
+
+
+class MemoryImageCache:
+    """Hot tier of encoded image bytes in front of DiskImageCache.
+
+    Holds the response body and its ETag for the most recently served sizes, so a
+    hit is answered without touching the filesystem. Bounded by total body bytes;
+    bodies over ``max_entry_bytes`` are only ever served from disk.
+    """
+
+    def __init__(self, max_bytes=IMAGE_MEMORY_CACHE_BYTES, max_entry_bytes=IMAGE_MEMORY_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.entries = OrderedDict()  # key -> (body, etag)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """(body, etag) for ``key``, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, key, body, etag):
+        if len(body) > self.max_entry_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.bytes -= len(old[0])
+            self.entries[key] = (body, etag)
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+disk_image_cache = DiskImageCache()
+memory_image_cache = MemoryImageCache()
+
+
+def image_tier_stats():
+    """Where resized images were served from: memory, disk, or resized on a miss."""
+    memory, disk = memory_image_cache.stats(), disk_image_cache.stats()
+    return {"memory_hits": memory["hits"], "disk_hits": disk["hits"], "misses": disk["misses"]}
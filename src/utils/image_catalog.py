@@ -0,0 +1,140 @@
+import os
+import random
+import threading
+import time
+
+from utils import helpers
+from utils.image_processing import source_digest, source_key
+
+
+IMAGE_EXTENSIONS = (".jpg", ".png", ".jpeg")
+IMAGE_CATALOG_CHECK_INTERVAL = float(os.getenv("IMAGE_CATALOG_CHECK_INTERVAL", 5))  # seconds
+
+
+class CatalogSnapshot:
+    """Immutable view of the image folders: category -> {name: absolute path}.
+
+    Also holds each image's source_key as stat'd when the snapshot was built, and
+    the source digests computed so far, so requests never stat or hash a source
+    more than once per snapshot.
+    """
+
+    __slots__ = ("images", "choices", "directories", "sources", "digests", "built_at")
+
+    def __init__(self, images, directories=None, sources=None):
+        self.images = images
+        self.choices = {category: tuple(paths.values()) for category, paths in images.items()}
+        self.directories = directories or {}  # category -> folder, for the staleness check
+        self.sources = sources or {}  # path -> (real path, mtime_ns, size)
+        self.digests = {}  # path -> source_digest, filled in on first use
+        self.built_at = time.time()
+
+    @classmethod
+    def scan(cls, directories):
+        images = {}
+        for category, directory in directories.items():
+            images[category] = {
+                os.path.splitext(filename)[0]: os.path.abspath(os.path.join(directory, filename))
+                for filename in sorted(os.listdir(directory))
+                if filename.endswith(IMAGE_EXTENSIONS)
+            }
+        sources = {}
+        for paths in images.values():
+            for path in paths.values():
+                try:
+                    sources[path] = source_key(path)
+                except FileNotFoundError:  # Removed since the listing; the next check rebuilds
+                    pass
+        return cls(images, directories, sources)
+
+    def lookup(self, category, name):
+        """Unknown names fall back to the category's default; "random" picks any image in it."""
+        paths = self.images.get(category)
+        if paths is None:
+            return None
+        if name == "random":
+            choices = self.choices[category]
+            return random.choice(choices) if choices else paths.get("default")
+        return paths.get(name) or paths.get("default")
+
+
+class ImageCatalog:
+    """In-memory replacement for the per-request ImageMapping lookups.
+
+    Requests read the current snapshot without locking or I/O. At most once per
+    IMAGE_CATALOG_CHECK_INTERVAL a request re-reads the folders' modification
+    times; if any folder changed, a new snapshot is built and swapped in whole.
+    """
+
+    def __init__(self, check_interval=IMAGE_CATALOG_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.snapshot = CatalogSnapshot({})
+        self.signature = None
+        self.checked_at = 0.0
+        self.refreshes = 0
+        self.lock = threading.Lock()
+
+    def folder_signature(self, directories=None):
+        """Modification times of static/ and of the category folders (the snapshot's by default).
+
+        Only stat calls, no listing: adding or removing a category folder changes
+        the mtime of static/ itself.
+        """
+        directories = self.snapshot.directories if directories is None else directories
+        try:
+            folders = tuple(sorted(
+                (category, os.stat(directory).st_mtime_ns)
+                for category, directory in directories.items()
+            ))
+            return os.stat(helpers.STATIC_DIR).st_mtime_ns, folders
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        """Rebuild the snapshot now and swap it in atomically."""
+        with self.lock:
+            directories = helpers.get_category_directories()
+            self.signature = self.folder_signature(directories)
+            self.snapshot = CatalogSnapshot.scan(directories)
+            self.checked_at = time.time()
+            self.refreshes += 1
+        return self.snapshot
+
+    def check(self):
+        """Rebuild if the folders changed since the last check (rate-limited)."""
+        if time.time() - self.checked_at < self.check_interval or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.checked_at = time.time()
+            changed = self.folder_signature() != self.signature
+        finally:
+            self.lock.release()
+        if changed:
+            self.refresh()
+
+    def get_image_path(self, category, name):
+        self.check()
+        return self.snapshot.lookup(category, name)
+
+    def cached_digest(self, path):
+        """Source digest of a catalog image if already computed for this snapshot, else None."""
+        return self.snapshot.digests.get(path)
+
+    def digest(self, path):
+        """Source digest of an image, memoized in the current snapshot; hashes the file the first time."""
+        snapshot = self.snapshot
+        digest = snapshot.digests.get(path)
+        if digest is None:
+            digest = snapshot.digests[path] = source_digest(*(snapshot.sources.get(path) or source_key(path)))
+        return digest
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            "categories": {category: len(paths) for category, paths in snapshot.images.items()},
+            "built_at": snapshot.built_at,
+            "refreshes": self.refreshes,
+        }
+
+
+image_catalog = ImageCatalog()
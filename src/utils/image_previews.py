@@ -0,0 +1,128 @@
+"""
+Tiny previews of the catalog images for pages to show while the real image
+loads: a BlurHash string (https://blurha.sh) and a ~32px JPEG as a base64 data
+URI (LQIP). They are computed once per image when the Datastore image mappings
+are synced, stored on the ImageMapping entities, and served per category from
+memory by GET /images/{category}/previews.
+"""
+import base64
+import io
+import math
+
+from PIL import Image
+
+from utils.http_cache import compute_etag
+
+PREVIEW_SIZE = 32  # Longest side of the LQIP thumbnail, in pixels
+PREVIEW_QUALITY = 50
+BLURHASH_COMPONENTS = 4  # Along the longer side; 3 along the shorter one
+BLURHASH_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def encode83(value, length):
+    return "".join(BLURHASH_CHARACTERS[value // 83 ** (length - i - 1) % 83] for i in range(length))
+
+
+def srgb_to_linear(value):
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+SRGB_TO_LINEAR = [srgb_to_linear(value) for value in range(256)]
+
+
+def linear_to_srgb(value):
+    v = max(0.0, min(1.0, value))
+    return int(v * 12.92 * 255 + 0.5) if v <= 0.0031308 else int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def sign_pow(value, exponent):
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def blurhash(image, x_components, y_components):
+    """BlurHash of an RGB image; meant for thumbnails, as the cost grows with the pixel count."""
+    width, height = image.size
+    data = image.tobytes()
+    linear = [tuple(SRGB_TO_LINEAR[c] for c in data[k:k + 3]) for k in range(0, len(data), 3)]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            r = g = b = 0.0
+            for y in range(height):
+                row, basis_y = y * width, cos_y[j][y]
+                for x in range(width):
+                    basis = cos_x[i][x] * basis_y
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = encode83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantised_max = max(0, min(82, math.floor(max(abs(c) for f in ac for c in f) * 166 - 0.5)))
+        maximum = (quantised_max + 1) / 166
+    else:
+        quantised_max, maximum = 0, 1
+    result += encode83(quantised_max, 1)
+    result += encode83((linear_to_srgb(dc[0]) << 16) + (linear_to_srgb(dc[1]) << 8) + linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (max(0, min(18, math.floor(sign_pow(c / maximum, 0.5) * 9 + 9.5))) for c in factor)
+        result += encode83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+
+def compute_preview(image_path):
+    """{"width", "height", "blurhash", "lqip"} for an image file; width and height are the original's."""
+    with Image.open(image_path) as img:
+        size = img.size
+        img.draft("RGB", (PREVIEW_SIZE * 2, PREVIEW_SIZE * 2))  # JPEG: decode at 1/2..1/8 scale
+        thumbnail = img.convert("RGB")
+    thumbnail.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE), Image.LANCZOS)
+
+    landscape = size[0] >= size[1]
+    x_components = BLURHASH_COMPONENTS if landscape else BLURHASH_COMPONENTS - 1
+    y_components = BLURHASH_COMPONENTS - 1 if landscape else BLURHASH_COMPONENTS
+
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, "JPEG", quality=PREVIEW_QUALITY, optimize=True)
+    return {
+        "width": size[0],
+        "height": size[1],
+        "blurhash": blurhash(thumbnail, x_components, y_components),
+        "lqip": "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii"),
+    }
+
+
+class ImagePreviews:
+    """Previews by category, swapped in whole after each image mapping sync."""
+
+    def __init__(self):
+        self.by_category = {}  # category -> [{"name", "width", "height", "blurhash", "lqip"}], sorted by name
+        self.etags = {}  # category -> ETag of its previews
+
+    def replace(self, previews):
+        by_category = {}
+        for preview in previews:
+            by_category.setdefault(preview["category"], []).append(
+                {field: preview[field] for field in ("name", "width", "height", "blurhash", "lqip")}
+            )
+        for entries in by_category.values():
+            entries.sort(key=lambda entry: entry["name"])
+        self.by_category, self.etags = by_category, {category: compute_etag(entries) for category, entries in by_category.items()}
+
+    def get(self, category):
+        """(previews, ETag) for a category; no previews yet is an empty list."""
+        return self.by_category.get(category, []), self.etags.get(category) or compute_etag([])
+
+    def stats(self):
+        return {category: len(entries) for category, entries in self.by_category.items()}
+
+
+image_previews = ImagePreviews()
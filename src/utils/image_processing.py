@@ -1,34 +1,270 @@
-from PIL import Image
+from PIL import Image, features
+import hashlib
 import os
+import threading
 import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from utils.image_cache import IMAGE_CACHE_DIR, disk_image_cache
 
-CACHE_DIR = "cache/" 
+try:
+    import fcntl
+except ImportError:  # No cross-process locking on Windows
+    fcntl = None
 
-def clear_cache_on_restart():
-    """Deletes all cached images on restart to match updated mappings."""
-    if os.path.exists(CACHE_DIR):
-        
-        for file in os.listdir(CACHE_DIR):
-            file_path = os.path.join(CACHE_DIR, file)
-            if os.path.isfile(file_path):
-                print(f"Removing cached file: {file_path}")
-                os.remove(file_path)
+LOCK_DIR = os.path.join(IMAGE_CACHE_DIR, ".locks")
+LOCK_STRIPES = 64  # Lock files shared by all sizes, so their number stays fixed
+DECODED_IMAGE_CACHE_BYTES = int(os.getenv("DECODED_IMAGE_CACHE_BYTES", 256 * 1024 * 1024))
 
+# Resize quality presets: (JPEG draft oversampling, resampling filter, reducing_gap).
+# Draft mode lets the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding, keeping at
+# least ``oversampling`` times the target size; reducing_gap then does a cheap integer
+# reduce before the final filter. "best" decodes at full size and filters once.
+RESIZE_PRESETS = {
+    "fast": (1, Image.Resampling.BILINEAR, 1.5),
+    "balanced": (2, Image.Resampling.LANCZOS, 2.0),
+    "best": (None, Image.Resampling.LANCZOS, None),
+}
+DEFAULT_RESIZE_PRESET = os.getenv("RESIZE_PRESET", "balanced")
+DRAFT_SCALES = (8, 4, 2)
 
-def resize_image(image_path: str, width: int, height: int) -> str:
-    """Resizes an image and caches it."""
-    os.makedirs(CACHE_DIR, exist_ok=True) 
-    cached_path = os.path.join(CACHE_DIR, f"{width}x{height}_{os.path.basename(image_path)}")
+# Output formats: name -> (Pillow format, media type, extension, default quality, save options).
+# Quality is ignored for PNG, which is lossless. AVIF needs a Pillow built with libavif.
+OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", ".jpg", 75, {"progressive": True, "optimize": True}),
+    "png": ("PNG", "image/png", ".png", None, {"optimize": True}),
+}
+if features.check("webp"):
+    OUTPUT_FORMATS["webp"] = ("WEBP", "image/webp", ".webp", 80, {"method": 4})
+if features.check("avif"):
+    OUTPUT_FORMATS["avif"] = ("AVIF", "image/avif", ".avif", 50, {"speed": 8})
+DEFAULT_IMAGE_FORMAT = "jpeg"
+# Formats picked from the Accept header, smallest output first
+NEGOTIATED_FORMATS = [name for name in ("avif", "webp") if name in OUTPUT_FORMATS]
+
+
+class DecodedImageCache:
+    """LRU of decoded source images, bounded by the bytes their pixels occupy.
+
+    Entries are keyed by the file's path, mtime and size, so an edited source is
+    decoded again. Each entry remembers how long its decode took; every hit adds
+    that to ``decode_seconds_saved``.
+    """
+
+    def __init__(self, max_bytes=DECODED_IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (image, nbytes, decode_seconds)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.decode_seconds = 0.0
+        self.decode_seconds_saved = 0.0
+
+    def get(self, image_path, scale=1):
+        """Decoded pixels of ``image_path``; callers must not modify the returned image.
+
+        A ``scale`` above 1 asks the JPEG decoder for a 1/scale image (draft mode);
+        each scale is cached separately.
+        """
+        key = (*source_key(image_path), scale)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self.decode_seconds_saved += entry[2]
+                return entry[0]
+            self.misses += 1
+
+        started = time.perf_counter()
+        with Image.open(image_path) as source:
+            if scale > 1:
+                source.draft(source.mode, (source.width // scale, source.height // scale))
+            source.load()
+            img = source.copy()
+        elapsed = time.perf_counter() - started
+
+        nbytes = img.width * img.height * len(img.getbands())
+        with self.lock:
+            self.decode_seconds += elapsed
+            if nbytes <= self.max_bytes and key not in self.entries:
+                self.entries[key] = (img, nbytes, elapsed)
+                self.bytes += nbytes
+                while self.bytes > self.max_bytes:
+                    _, (_, evicted_bytes, _) = self.entries.popitem(last=False)
+                    self.bytes -= evicted_bytes
+                    self.evictions += 1
+        return img
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "decode_seconds": round(self.decode_seconds, 3),
+                "decode_seconds_saved": round(self.decode_seconds_saved, 3),
+            }
+
+
+decoded_image_cache = DecodedImageCache()
+
+
+def source_key(image_path):
+    """Identity of a source file's current contents: path, mtime and size."""
+    stat = os.stat(image_path)
+    return os.path.realpath(image_path), stat.st_mtime_ns, stat.st_size
+
+
+@lru_cache(maxsize=1024)
+def source_header(path, mtime_ns, size):
+    """(width, height) and format of a source image, read from its header only."""
+    with Image.open(path) as img:
+        return img.size, img.format
+
+
+def draft_scale(source_size, target_size, oversampling):
+    """Largest JPEG draft scale that still leaves ``oversampling`` x the target size."""
+    for scale in DRAFT_SCALES:
+        if all(src / scale >= dst * oversampling for src, dst in zip(source_size, target_size)):
+            return scale
+    return 1
+
+
+def resize_pixels(image_path, width, height, preset=DEFAULT_RESIZE_PRESET, cache=decoded_image_cache):
+    """Resized copy of a source image using one of RESIZE_PRESETS."""
+    oversampling, resample, reducing_gap = RESIZE_PRESETS[preset]
+    scale = 1
+    if oversampling:
+        size, image_format = source_header(*source_key(image_path))
+        if image_format == "JPEG":
+            scale = draft_scale(size, (width, height), oversampling)
+
+    # Resizing returns a new image, so the shared decoded source is never modified
+    return cache.get(image_path, scale).resize((width, height), resample, reducing_gap=reducing_gap)
+
+
+@lru_cache(maxsize=1024)
+def source_digest(path, mtime_ns, size):
+    """SHA-256 of a source image's bytes, so renamed or re-uploaded copies share cache entries."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def negotiate_image_format(accept):
+    """Smallest output format the Accept header explicitly allows, else JPEG."""
+    accepted = set()
+    for part in (accept or "").split(","):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        weights = [param[2:] for param in params if param.startswith("q=")]
+        try:
+            if weights and float(weights[0]) <= 0:
+                continue  # Explicitly refused
+        except ValueError:
+            continue
+        accepted.add(media_type.lower())
+    for name in NEGOTIATED_FORMATS:
+        if OUTPUT_FORMATS[name][1] in accepted:
+            return name
+    return DEFAULT_IMAGE_FORMAT
+
+
+def output_quality(image_format: str, quality=None):
+    """Encoder quality actually used: the format's default, or None for lossless formats."""
+    default = OUTPUT_FORMATS[image_format][3]
+    if default is None:
+        return None
+    return default if quality is None else quality
+
+
+def resize_key(image_path: str, width: int, height: int, preset: str = DEFAULT_RESIZE_PRESET,
+               image_format: str = DEFAULT_IMAGE_FORMAT, quality=None, digest: str = None) -> str:
+    """Content address of a resized image: the source's bytes plus every output setting.
+
+    ``digest`` is the source's source_digest when the caller already has it.
+    """
+    quality = output_quality(image_format, quality)
+    digest = digest or source_digest(*source_key(image_path))
+    settings = f"{digest}:{width}x{height}:{preset}:{image_format}:{quality}"
+    return hashlib.sha256(settings.encode()).hexdigest() + OUTPUT_FORMATS[image_format][2]
+
+
+def resize_etag(key: str) -> str:
+    """Strong ETag for the resized image with this resize_key; the same on every host and across restarts."""
+    return f'"{key[:32]}"'
+
+
+def resized_path(image_path: str, width: int, height: int, preset: str = DEFAULT_RESIZE_PRESET,
+                 image_format: str = DEFAULT_IMAGE_FORMAT, quality=None) -> str:
+    """Where the resized copy of an image is cached."""
+    return disk_image_cache.path_for(resize_key(image_path, width, height, preset, image_format, quality))
+
+
+def encode_image(img, fp, image_format: str = DEFAULT_IMAGE_FORMAT, quality=None):
+    """Write ``img`` to a path or file object in one of OUTPUT_FORMATS."""
+    pil_format, _, _, _, options = OUTPUT_FORMATS[image_format]
+    quality = output_quality(image_format, quality)
+    if quality is not None:
+        options = {**options, "quality": quality}
+    if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    img.save(fp, pil_format, **options)
+
+
+@contextmanager
+def resize_lock(cached_path):
+    """Exclusive lock across processes (uvicorn and resize workers) for one output file."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    stripe = zlib.crc32(cached_path.encode()) % LOCK_STRIPES
+    with open(os.path.join(LOCK_DIR, f"{stripe}.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def resize_image(image_path: str, width: int, height: int, preset: str = DEFAULT_RESIZE_PRESET,
+                 image_format: str = DEFAULT_IMAGE_FORMAT, quality=None) -> str:
+    """Resizes an image, encodes it in ``image_format`` and caches it.
+
+    Another process may be producing the same file: the first to take the lock
+    resizes, the others wait and then find the file in place. Files are written
+    under a temporary name and renamed, so readers never see a partial image.
+    """
+    cached_path = resized_path(image_path, width, height, preset, image_format, quality)
+    os.makedirs(os.path.dirname(cached_path), exist_ok=True)
 
     if os.path.exists(cached_path):
         return cached_path  
 
-    img = Image.open(image_path)
-    img = img.resize((width, height))
-    img.save(cached_path, "JPEG")  
+    with resize_lock(cached_path):
+        if os.path.exists(cached_path):
+            return cached_path
 
-    return cached_path
+        img = resize_pixels(image_path, width, height, preset)
+        tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+        try:
+            encode_image(img, tmp_path, image_format, quality)
+            os.replace(tmp_path, cached_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
 
+    return cached_path
 
-clear_cache_on_restart()
 
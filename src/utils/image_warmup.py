@@ -0,0 +1,174 @@
+"""
+Pre-renders the most requested placeholder sizes after a start.
+
+The image endpoint counts every (category, name, width, height, preset, format,
+quality) it serves. Counts are flushed to IMAGE_ACCESS_STATS_FILE, merged with
+what other workers and earlier runs recorded, so they survive restarts and
+deploys. At startup (and on POST /internal/warmup) the top IMAGE_WARMUP_TOP_N
+entries missing from the disk cache are resized one at a time, yielding to live
+requests, until IMAGE_WARMUP_BUDGET seconds have been spent.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from utils.image_cache import IMAGE_CACHE_DIR, disk_image_cache
+from utils.image_catalog import image_catalog
+from utils.image_processing import resize_key
+from utils.resize_pool import PoolSaturated, resize_pool
+
+try:
+    import fcntl
+except ImportError:  # No cross-process locking on Windows
+    fcntl = None
+
+IMAGE_ACCESS_STATS_FILE = os.getenv("IMAGE_ACCESS_STATS_FILE", os.path.join(IMAGE_CACHE_DIR, ".stats", "access.json"))
+IMAGE_ACCESS_STATS_MAX_ENTRIES = int(os.getenv("IMAGE_ACCESS_STATS_MAX_ENTRIES", 5000))
+IMAGE_ACCESS_FLUSH_INTERVAL = float(os.getenv("IMAGE_ACCESS_FLUSH_INTERVAL", 60))  # seconds
+IMAGE_WARMUP_TOP_N = int(os.getenv("IMAGE_WARMUP_TOP_N", 100))  # 0 disables the startup warmup
+IMAGE_WARMUP_BUDGET = float(os.getenv("IMAGE_WARMUP_BUDGET", 60))  # seconds of resizing per warmup
+IMAGE_WARMUP_MAX_TOP_N = int(os.getenv("IMAGE_WARMUP_MAX_TOP_N", 1000))  # upper bounds for POST /internal/warmup
+IMAGE_WARMUP_MAX_BUDGET = float(os.getenv("IMAGE_WARMUP_MAX_BUDGET", 600))
+
+
+class AccessStats:
+    """Request counts per placeholder output, persisted as JSON.
+
+    ``record`` only bumps an in-memory counter. ``flush`` adds the counts recorded
+    since the last flush to the file under a lock, so several workers can share it.
+    Only the ``max_entries`` most requested outputs are kept.
+    """
+
+    def __init__(self, path=IMAGE_ACCESS_STATS_FILE, max_entries=IMAGE_ACCESS_STATS_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.counts = Counter()  # Merged view: file + pending
+        self.pending = Counter()  # Recorded since the last flush
+        self.lock = threading.Lock()
+        self.flushed_at = None
+
+    def record(self, category, name, width, height, preset, image_format, quality):
+        key = (category, name, width, height, preset, image_format, quality)
+        with self.lock:
+            self.counts[key] += 1
+            self.pending[key] += 1
+
+    def read_file(self):
+        try:
+            with open(self.path) as f:
+                return Counter({tuple(entry[:-1]): entry[-1] for entry in json.load(f)})
+        except (OSError, ValueError, TypeError):
+            return Counter()
+
+    def load(self):
+        with self.lock:
+            self.counts = self.read_file() + self.pending
+
+    def flush(self):
+        """Merge pending counts into the file and reload everyone's counts from it."""
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            merged = self.read_file() + pending
+            entries = [[*key, count] for key, count in merged.most_common(self.max_entries)]
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        with self.lock:
+            self.counts = Counter({tuple(entry[:-1]): entry[-1] for entry in entries}) + self.pending
+            self.flushed_at = time.time()
+
+    def top(self, n):
+        with self.lock:
+            return [key for key, _ in self.counts.most_common(n)]
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.counts), "pending": sum(self.pending.values()), "flushed_at": self.flushed_at}
+
+
+class ImageWarmup:
+    """Background pre-rendering of the most requested outputs, within a time budget."""
+
+    def __init__(self, access_stats):
+        self.access_stats = access_stats
+        self.task = None
+        self.started_at = None
+        self.finished_at = None
+        self.rendered = 0
+        self.skipped = 0  # Already cached
+        self.failed = 0
+        self.budget_exhausted = False
+
+    def outputs(self, top_n):
+        """Resize arguments for the top entries; 'random' covers the whole category."""
+        for category, name, width, height, preset, image_format, quality in self.access_stats.top(top_n):
+            if name == "random":
+                paths = image_catalog.snapshot.choices.get(category, ())
+            else:
+                paths = [image_catalog.snapshot.lookup(category, name)]
+            for image_path in paths:
+                if image_path:
+                    yield image_path, width, height, preset, image_format, quality
+
+    def start(self, top_n=IMAGE_WARMUP_TOP_N, budget=IMAGE_WARMUP_BUDGET):
+        """Start a warmup unless one is running. Returns False if one already was."""
+        if self.task is not None and not self.task.done():
+            return False
+        self.started_at, self.finished_at = time.time(), None
+        self.rendered = self.skipped = self.failed = 0
+        self.budget_exhausted = False
+        self.task = asyncio.create_task(self.run(top_n, budget))
+        return True
+
+    async def run(self, top_n, budget):
+        deadline = time.monotonic() + budget
+        for image_path, width, height, preset, image_format, quality in self.outputs(top_n):
+            if time.monotonic() >= deadline:
+                self.budget_exhausted = True
+                break
+            try:
+                digest = await asyncio.to_thread(image_catalog.digest, image_path)
+                key = resize_key(image_path, width, height, preset, image_format, quality, digest)
+                if await asyncio.to_thread(disk_image_cache.contains, key):
+                    self.skipped += 1
+                    continue
+                # Low priority: only resize while no live request is waiting on the pool
+                while resize_pool.pending > 0:
+                    await asyncio.sleep(0.05)
+                path = await resize_pool.resize(image_path, width, height, preset, image_format, quality)
+                disk_image_cache.add(key, os.path.getsize(path))
+                self.rendered += 1
+            except PoolSaturated:
+                await asyncio.sleep(1)
+            except Exception as e:
+                self.failed += 1
+                print(f"Warmup failed for {image_path} at {width}x{height}: {e}")
+        self.finished_at = time.time()
+        print(f"Image warmup: {self.rendered} rendered, {self.skipped} already cached, {self.failed} failed "
+              f"in {self.finished_at - self.started_at:.1f}s")
+
+    def stats(self):
+        return {
+            "running": self.task is not None and not self.task.done(),
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "rendered": self.rendered,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "budget_exhausted": self.budget_exhausted,
+            "access_stats": self.access_stats.stats(),
+        }
+
+
+access_stats = AccessStats()
+image_warmup = ImageWarmup(access_stats)
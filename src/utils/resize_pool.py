@@ -0,0 +1,157 @@
+"""
+Bounded process pool for placeholder image resizing.
+
+Resizing is CPU-bound, so it runs in RESIZE_WORKERS separate processes (spawned,
+not forked, so no Datastore/gRPC state is inherited) instead of on the event
+loop. At most RESIZE_QUEUE_LIMIT resizes may be running or waiting; past that,
+``resize`` raises PoolSaturated and the endpoint answers 503 with Retry-After
+rather than letting latency grow without bound.
+
+Concurrent requests for the same output are coalesced: the first submits the
+resize and the rest await its result. Across uvicorn workers the same is done
+by resize_image's file lock.
+
+RESIZE_WORKERS=0 resizes on the event loop's thread pool instead (one process).
+The default splits the CPUs between the FASTAPI_WORKERS uvicorn workers.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.image_processing import decoded_image_cache, resize_image
+
+
+FASTAPI_WORKERS = int(os.getenv("FASTAPI_WORKERS", 1))
+RESIZE_WORKERS = int(os.getenv("RESIZE_WORKERS", max(1, (os.cpu_count() or 1) // FASTAPI_WORKERS)))
+RESIZE_QUEUE_LIMIT = int(os.getenv("RESIZE_QUEUE_LIMIT", 64))  # running + waiting resizes
+RESIZE_RETRY_AFTER = int(os.getenv("RESIZE_RETRY_AFTER", 1))  # seconds, sent on 503
+
+
+class PoolSaturated(Exception):
+    """Raised when RESIZE_QUEUE_LIMIT resizes are already running or queued."""
+
+
+def warm_up():
+    """No-op job; unpickling it imports this module (and Pillow) in the worker."""
+    return os.getpid()
+
+
+def resize_job(image_path, width, height, preset, image_format, quality):
+    """Runs in a worker: resize, and report when the job started and the worker's cache stats."""
+    started = time.time()
+    path = resize_image(image_path, width, height, preset, image_format, quality)
+    return path, started, os.getpid(), decoded_image_cache.stats()
+
+
+class ResizePool:
+    def __init__(self, workers=RESIZE_WORKERS, queue_limit=RESIZE_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.executor = None
+        self.pending = 0  # Only touched on the event loop
+        self.inflight = {}  # (image_path, width, height, preset, image_format, quality) -> Task
+        self.coalesced = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.worker_cache_stats = {}  # pid -> latest decoded_image_cache stats
+
+    def start(self):
+        if self.workers > 0 and self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            # Start the workers now rather than on the first requests
+            for _ in range(self.workers):
+                self.executor.submit(warm_up)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def resize(self, image_path, width, height, preset, image_format="jpeg", quality=None):
+        """Resize in the pool and return the cached file path.
+
+        Joins an identical resize that is already in flight instead of starting
+        another one. Waiters are shielded, so a client disconnecting does not
+        cancel the resize for everyone else.
+        """
+        key = (image_path, width, height, preset, image_format, quality)
+        task = self.inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self.submit(*key))
+            self.inflight[key] = task
+            task.add_done_callback(lambda done: self.finish(key, done))
+        return await asyncio.shield(task)
+
+    def finish(self, key, task):
+        self.inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Retrieved by the waiters; avoids "never retrieved" warnings
+
+    async def submit(self, image_path, width, height, preset, image_format, quality):
+        if self.pending >= self.queue_limit:
+            self.rejected += 1
+            raise PoolSaturated()
+
+        self.pending += 1
+        submitted = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            path, started, pid, cache_stats = await loop.run_in_executor(
+                self.executor, resize_job, image_path, width, height, preset, image_format, quality
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); replace the pool for later requests
+            self.failed += 1
+            self.shutdown()
+            self.start()
+            raise
+        finally:
+            self.pending -= 1
+
+        finished = time.time()
+        wait = max(0.0, started - submitted)
+        self.completed += 1
+        self.wait_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        self.run_seconds += finished - started
+        self.worker_cache_stats[pid] = cache_stats
+        return path
+
+    def decoded_image_stats(self):
+        """Decoded-source cache counters summed over the workers (or this process)."""
+        if self.workers <= 0:
+            return decoded_image_cache.stats()
+        totals = {}
+        for stats in self.worker_cache_stats.values():
+            for name, value in stats.items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.pending,
+            "coalesced": self.coalesced,
+            "queue_depth": max(0, self.pending - max(self.workers, 1)),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.wait_seconds / self.completed * 1000, 2) if self.completed else 0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+            "avg_run_ms": round(self.run_seconds / self.completed * 1000, 2) if self.completed else 0,
+        }
+
+
+resize_pool = ResizePool()
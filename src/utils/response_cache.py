@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from utils.http_cache import shared_max_age
+
+
+RESPONSE_CACHE_ROUTE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ROUTE_ENTRIES", 256))
+RESPONSE_CACHE_ROUTE_BYTES = int(os.getenv("RESPONSE_CACHE_ROUTE_BYTES", 8 * 1024 * 1024))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", 1024 * 1024))
+
+# Headers kept with a cached response and replayed to clients
+CACHED_HEADERS = ("Content-Type", "Content-Disposition", "ETag", "Last-Modified", "Cache-Control", "Vary")
+
+
+def normalize_url(url, params=None):
+    """Cache key for an upstream GET: the URL plus its query sorted, empty values dropped."""
+    items = sorted((k, str(v)) for k, v in (params or {}).items() if v is not None)
+    return f"{url}?{urlencode(items)}" if items else url
+
+
+class CachedResponse:
+    __slots__ = ("status", "headers", "body", "expiry")
+
+    def __init__(self, status, headers, body, expiry):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expiry = expiry
+
+
+class RouteCache:
+    """LRU for one gateway route, bounded by entry count and total body bytes."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.bytes -= len(entry.body)
+        return entry
+
+    def put(self, key, entry):
+        self.pop(key)
+        self.entries[key] = entry
+        self.bytes += len(entry.body)
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= len(evicted.body)
+
+
+class ResponseCache:
+    """Gateway-side cache of idempotent upstream GET responses.
+
+    Keyed by the normalized upstream URL (which never contains the API key), and only
+    responses FastAPI marks as shareable via Cache-Control are stored, for as long as
+    max-age allows. Each route has its own entry and byte limits.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_ROUTE_ENTRIES, max_bytes=RESPONSE_CACHE_ROUTE_BYTES,
+                 max_entry_bytes=RESPONSE_CACHE_MAX_ENTRY_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def _route(self, route):
+        if route not in self.routes:
+            self.routes[route] = RouteCache(self.max_entries, self.max_bytes)
+        return self.routes[route]
+
+    def get(self, route, key):
+        with self.lock:
+            cache = self._route(route)
+            entry = cache.entries.get(key)
+            if entry and time.time() < entry.expiry:
+                cache.entries.move_to_end(key)
+                cache.hits += 1
+                return entry
+            if entry:
+                cache.pop(key)
+            cache.misses += 1
+            return None
+
+    def store(self, route, key, status, headers, body):
+        """Cache an upstream response if its status and Cache-Control allow it."""
+        if status != 200 or len(body) > self.max_entry_bytes:
+            return False
+        ttl = shared_max_age(headers.get("Cache-Control"))
+        if ttl <= 0:
+            return False
+
+        kept = {name: headers[name] for name in CACHED_HEADERS if name in headers}
+        entry = CachedResponse(status, kept, body, time.time() + ttl)
+        with self.lock:
+            self._route(route).put(key, entry)
+        return True
+
+    def invalidate_prefix(self, route, prefix):
+        """Drop entries for ``prefix`` itself or ``prefix`` with any query string."""
+        with self.lock:
+            cache = self._route(route)
+            stale = [key for key in cache.entries if key == prefix or key.startswith(prefix + "?")]
+            for key in stale:
+                cache.pop(key)
+        return len(stale)
+
+    def stats(self):
+        with self.lock:
+            return {
+                route: {
+                    "entries": len(cache.entries),
+                    "bytes": cache.bytes,
+                    "hits": cache.hits,
+                    "misses": cache.misses,
+                }
+                for route, cache in self.routes.items()
+            }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,87 @@
+"""
+The ``synthetic`` placeholder category: solid or gradient boxes with a text
+label, drawn by Pillow at the requested size instead of decoding and resizing a
+photo.
+
+The image name selects the background: a color (``gray``, ``ff8800``), two
+colors joined by ``-`` for a top-to-bottom gradient (``navy-teal``), or
+``random`` for a palette color. The label defaults to "WIDTHxHEIGHT". The same
+name, size, label and output settings always give the same bytes, so responses
+carry a stable ETag and are kept in the in-memory image cache.
+"""
+import hashlib
+import io
+import random
+from functools import lru_cache
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from utils.image_processing import OUTPUT_FORMATS, encode_image, output_quality
+
+SYNTHETIC_CATEGORY = "synthetic"
+SYNTHETIC_VERSION = 1  # Bump when rendering changes, so cached ETags and bytes are replaced
+SYNTHETIC_PALETTE = ("lightgray", "steelblue", "seagreen", "coral", "goldenrod", "slategray", "orchid", "teal")
+TEXT_MAX_LENGTH = 100
+
+
+def parse_color(value):
+    """RGB tuple for a CSS color name or a hex value with or without '#'; ValueError if neither."""
+    if len(value) in (3, 6) and all(c in "0123456789abcdefABCDEF" for c in value):
+        value = f"#{value}"
+    return ImageColor.getrgb(value)[:3]
+
+
+def parse_background(name):
+    """One or two colors for an image name; ValueError if it is not a color or gradient."""
+    if name == "random":
+        name = random.choice(SYNTHETIC_PALETTE)
+    colors = tuple(parse_color(part) for part in name.split("-"))
+    if len(colors) > 2:
+        raise ValueError(f"At most two colors: {name}")
+    return colors
+
+
+def label_color(colors):
+    """Black or white, whichever reads better on the background's average luminance."""
+    luminance = sum(0.299 * r + 0.587 * g + 0.114 * b for r, g, b in colors) / len(colors)
+    return (0, 0, 0) if luminance > 140 else (255, 255, 255)
+
+
+def font_for(width, height):
+    return load_font(max(8, min(width // 8, height // 3)))
+
+
+@lru_cache(maxsize=64)
+def load_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 only has the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def synthetic_key(colors, width, height, text, image_format, quality):
+    """Cache key (with the format's extension) of a synthetic image's exact bytes."""
+    quality = output_quality(image_format, quality)
+    settings = f"{SYNTHETIC_CATEGORY}:{SYNTHETIC_VERSION}:{colors}:{width}x{height}:{text!r}:{image_format}:{quality}"
+    return hashlib.sha256(settings.encode()).hexdigest() + OUTPUT_FORMATS[image_format][2]
+
+
+def render_synthetic(colors, width, height, text, image_format, quality=None):
+    """Draw and encode a synthetic image; returns the encoded bytes."""
+    if len(colors) == 1:
+        img = Image.new("RGB", (width, height), colors[0])
+    else:
+        mask = Image.linear_gradient("L").resize((width, height), Image.BILINEAR)
+        img = Image.composite(Image.new("RGB", (width, height), colors[1]),
+                              Image.new("RGB", (width, height), colors[0]), mask)
+
+    if text:
+        draw = ImageDraw.Draw(img)
+        font = font_for(width, height)
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+        position = ((width - (right - left)) / 2 - left, (height - (bottom - top)) / 2 - top)
+        draw.text(position, text, fill=label_color(colors), font=font)
+
+    buffer = io.BytesIO()
+    encode_image(img, buffer, image_format, quality)
+    return buffer.getvalue()